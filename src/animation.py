@@ -1,23 +1,46 @@
 from src.settings import *
+from src.utils.animation_file import AnimationFile
 
 from time import perf_counter
+import re
 
 class AsciiAnimation:
-    def __init__(self, animationFrames, animationWindow, topLeft, dimensions, disableResizing = False, playContinuously = False):
+    def __init__(self, animationFrames, animationWindow, topLeft, dimensions, disableResizing = False, playContinuously = False, fps = ANIMATION_SPEED):
         self.animationFrames = animationFrames
         self.currentFrameIndex = 0
         self.animationWindow = animationWindow
 
         self.width, self.height = dimensions
         self.left, self.top = topLeft
+        self.disableResizing = disableResizing
 
-        if not disableResizing:
-            self.resize_animation()
+        # Animation files are read (and resized) one frame at a time while playing, anything else is prepared up front
+        self.streamFrames = isinstance(animationFrames, AnimationFile)
+        self.cachedFrameIndex, self.cachedFrame = None, None
 
-        self.animationSpeed = 15 # Frames per second
+        if not self.streamFrames:
+            if not disableResizing:
+                self.resize_animation()
+            else:
+                # Trim once here so play can hand the rows over without slicing every frame
+                self.animationFrames = [self.trim_frame(frame) for frame in self.animationFrames]
+
+        # Output quality controls, see set_reduced / paused
+        self.fullFrames, self.reducedFrames = self.animationFrames, None
+        self.drawLeft, self.drawTop = self.left, self.top
+        self.drawWidth, self.drawHeight = self.width, self.height
+        self.reduced = False
+        self.paused = False # Keeps showing the current frame without advancing
+        self.frameChanged = True # Set when what is shown changes without the frame index moving
+
+        self.fps = fps # Speed the animation is meant to play at
+        self.animationSpeed = fps # Frames per second it currently plays at, lowered on slow terminals
         self.preTimer, self.timer = None, None # Timer that toggles on/off every 1/(frame rate of animation)
         self.playContinuously = playContinuously
 
+        self.lastPlayTime = None
+        self.droppedFrames = 0 # Frames whose display time passed between two plays
+
     @staticmethod
     def shrink_list(l, goalLength):
         if goalLength > len(l):
@@ -37,36 +60,81 @@ class AsciiAnimation:
         return left_pad + l + right_pad
 
 
-    def resize_animation(self):
-        # Width resizing
-        if len(self.animationFrames[0][0]) > self.width:
-            for frame in self.animationFrames:
-                for i, row in enumerate(frame):
-                    frame[i] = "".join(self.shrink_list(list(row), self.width))
+    @classmethod
+    def resize_frames(cls, frames, width, height):
+        """Crop or pad every frame around its center to width x height, returns new frames"""
+        resizedFrames = []
+        for frame in frames:
+            # Width resizing
+            if len(frame[0]) > width:
+                frame = [cls.shrink_list(row, width) for row in frame]
+            elif len(frame[0]) < width:
+                frame = ["".join(cls.expand_list(list(row), width)) for row in frame]
 
+            # Height resizing
+            if len(frame) > height:
+                frame = cls.shrink_list(frame, height)
+            elif len(frame) < height:
+                frame = cls.expand_list(frame, height)
+
+            resizedFrames.append(frame)
+        return resizedFrames
+
+    def trim_frame(self, frame):
+        return [row[:self.width] for row in frame[:self.height]]
+
+    def resize_animation(self):
+        self.animationFrames = self.resize_frames(self.animationFrames, self.width, self.height)
 
-        elif len(self.animationFrames[0][0]) < self.width:
-            for frame in self.animationFrames:
-                for i, row in enumerate(frame):
-                    frame[i] = "".join(self.expand_list(list(row), self.width))
+    def set_reduced(self, reduced):
+        """Switch to a smaller, centered crop of the animation to cut down on output"""
+        if reduced == self.reduced:
+            return
+        self.reduced = reduced
+        self.cachedFrameIndex = None
+        self.frameChanged = True
 
-        # Height resizing
-        if len(self.animationFrames[0]) > self.height:
-            for i, frame in enumerate(self.animationFrames):
-                self.animationFrames[i] = self.shrink_list(frame, self.height)
+        if not reduced:
+            self.animationFrames = self.fullFrames
+            self.drawLeft, self.drawTop = self.left, self.top
+            self.drawWidth, self.drawHeight = self.width, self.height
+            return
 
-        elif len(self.animationFrames[0]) < self.height:
-            for i, frame in enumerate(self.animationFrames):
-                self.animationFrames[i] = self.expand_list(frame, self.height)
+        self.drawWidth = max(int(self.width * REDUCED_ANIMATION_SCALE), 1)
+        self.drawHeight = max(int(self.height * REDUCED_ANIMATION_SCALE), 1)
+        self.drawLeft = self.left + (self.width - self.drawWidth) // 2
+        self.drawTop = self.top + (self.height - self.drawHeight) // 2
+        if not self.streamFrames:
+            if self.reducedFrames is None:
+                self.reducedFrames = self.resize_frames(self.fullFrames, self.drawWidth, self.drawHeight)
+            self.animationFrames = self.reducedFrames
 
+    def current_frame(self):
+        if not self.streamFrames:
+            return self.animationFrames[self.currentFrameIndex]
 
+        # Keep the last read frame around, the same frame is shown for several ticks
+        if self.cachedFrameIndex != self.currentFrameIndex:
+            frame = self.animationFrames[self.currentFrameIndex]
+            frame = self.trim_frame(frame) if self.disableResizing else self.resize_frames((frame,), self.width, self.height)[0]
+            if self.reduced:
+                frame = self.resize_frames((frame,), self.drawWidth, self.drawHeight)[0]
+            self.cachedFrameIndex, self.cachedFrame = self.currentFrameIndex, frame
+        return self.cachedFrame
 
     @property
     def isFinished(self):
         return self.currentFrameIndex == len(self.animationFrames) - 1
 
-    def play(self):
-        if self.preTimer is not None and self.timer != self.preTimer:
+    def advance(self):
+        """Move the animation along in time, returns True when the frame to show changed"""
+        now = perf_counter()
+        if self.lastPlayTime is not None and now - self.lastPlayTime < ANIMATION_RESUME_GAP:
+            self.droppedFrames += max(int((now - self.lastPlayTime) * self.animationSpeed) - 1, 0)
+        self.lastPlayTime = now
+
+        previousFrameIndex = self.currentFrameIndex
+        if self.preTimer is not None and self.timer != self.preTimer and not self.paused:
             self.currentFrameIndex += 1
             
             if self.playContinuously:
@@ -74,11 +142,127 @@ class AsciiAnimation:
             else:
                 self.currentFrameIndex = min(self.currentFrameIndex, len(self.animationFrames) - 1)       
 
-        self.preTimer, self.timer = self.timer, perf_counter() // (1 / (self.animationSpeed)) % 2
-        
-        for rowIdx in range(self.height):
-            self.animationWindow.add_string(self.left, rowIdx + self.top, self.animationFrames[self.currentFrameIndex][rowIdx][:self.width])
+        self.preTimer, self.timer = self.timer, now // (1 / (self.animationSpeed)) % 2
+
+        changed = self.frameChanged or self.currentFrameIndex != previousFrameIndex
+        self.frameChanged = False
+        return changed
 
     def reset(self):
+        if self.currentFrameIndex:
+            self.frameChanged = True
         self.currentFrameIndex = 0
-        
+
+
+class AnimationLayer:
+    def __init__(self, animation, z = 0, transparentChar = None):
+        self.animation = animation
+        self.z = z
+        self.transparentChar = transparentChar # Cells with this character show the layers below
+        self.opaqueRuns = re.compile(f"[^{re.escape(transparentChar)}]+") if transparentChar else None
+        self.drawnRect = None # Area the layer covered at the last full composite
+
+    @property
+    def rect(self):
+        animation = self.animation
+        return animation.drawLeft, animation.drawTop, animation.drawWidth, animation.drawHeight
+
+
+class AnimationCompositor:
+    """Plays several animation layers at once and merges them into a single set of rows per tick"""
+
+    def __init__(self, window):
+        self.window = window
+        self.layers = {}
+        self.activeNames = ()
+        self.activeLayers = [] # Sorted bottom to top
+
+        # Result of the last composite, only the areas of layers that changed frame get repainted
+        self.canvas = None # Rows of characters, None while a lone opaque layer is shown as is
+        self.rows = []
+        self.left, self.top = 0, 0
+        self.dirty = True # Everything has to be rebuilt (active layers or their placement changed)
+
+    def add_layer(self, name, animation, z = 0, transparentChar = None):
+        self.layers[name] = AnimationLayer(animation, z, transparentChar)
+        self.dirty = True
+
+    def set_active(self, names):
+        """Show only the named layers, passing the same tuple again is free"""
+        if names is self.activeNames:
+            return
+        self.activeNames = names
+        self.activeLayers = sorted((self.layers[name] for name in names), key = lambda layer: layer.z)
+        self.dirty = True
+
+    def tick(self):
+        changedLayers = [layer for layer in self.activeLayers if layer.animation.advance()]
+
+        # A layer that moved or got resized (e.g. reduced quality) can reach outside the canvas, start over then
+        if self.dirty or (self.canvas is None and changedLayers) or any(layer.rect != layer.drawnRect for layer in changedLayers):
+            self.composite()
+            self.dirty = False
+        elif changedLayers:
+            self.repaint_layers(changedLayers)
+
+        for rowIdx, row in enumerate(self.rows):
+            self.window.add_string(self.left, self.top + rowIdx, row, False)
+
+    def composite(self):
+        layers = self.activeLayers
+        for layer in layers:
+            layer.drawnRect = layer.rect
+
+        self.canvas = None
+        if not layers:
+            self.rows = []
+            return
+
+        # A lone opaque layer needs no merging, its frame can be used as is
+        if len(layers) == 1 and layers[0].transparentChar is None:
+            animation = layers[0].animation
+            self.left, self.top = animation.drawLeft, animation.drawTop
+            self.rows = animation.current_frame()
+            return
+
+        self.left = min(layer.animation.drawLeft for layer in layers)
+        self.top = min(layer.animation.drawTop for layer in layers)
+        width = max(layer.animation.drawLeft + layer.animation.drawWidth for layer in layers) - self.left
+        height = max(layer.animation.drawTop + layer.animation.drawHeight for layer in layers) - self.top
+
+        self.canvas = [[" "] * width for _ in range(height)]
+        self.rows = [""] * height
+        self.paint(0, 0, width, height)
+
+    def repaint_layers(self, layers):
+        """Repaint only the area covered by layers, everything else keeps its rows from the last tick"""
+        x0 = min(layer.animation.drawLeft for layer in layers) - self.left
+        y0 = min(layer.animation.drawTop for layer in layers) - self.top
+        x1 = max(layer.animation.drawLeft + layer.animation.drawWidth for layer in layers) - self.left
+        y1 = max(layer.animation.drawTop + layer.animation.drawHeight for layer in layers) - self.top
+        self.paint(x0, y0, x1, y1)
+
+    def paint(self, x0, y0, x1, y1):
+        """Redraw the canvas between columns x0:x1 and rows y0:y1 from every active layer, bottom to top"""
+        canvas = self.canvas
+        for y in range(y0, y1):
+            canvas[y][x0:x1] = " " * (x1 - x0)
+
+        for layer in self.activeLayers:
+            animation = layer.animation
+            x, y = animation.drawLeft - self.left, animation.drawTop - self.top
+            frame = animation.current_frame()
+            for rowIdx in range(max(y0 - y, 0), min(y1 - y, len(frame))):
+                # Only the part of the row inside the area, start is where it lands on the canvas
+                start = max(x0, x)
+                segment = frame[rowIdx][start - x:x1 - x]
+                line = canvas[y + rowIdx]
+                if layer.opaqueRuns is None:
+                    line[start:start + len(segment)] = segment
+                else:
+                    for run in layer.opaqueRuns.finditer(segment):
+                        line[start + run.start():start + run.end()] = run.group()
+
+        rows = self.rows
+        for y in range(y0, y1):
+            rows[y] = "".join(canvas[y])
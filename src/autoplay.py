@@ -0,0 +1,101 @@
+from src.settings import *
+
+from abc import ABC, abstractmethod
+
+
+class BettingStrategy(ABC):
+    """Decides the bets of an auto-play run, one round at a time"""
+    name = ""
+    prediction = "heads" # The coin is fair, always calling the same side is as good as anything else
+
+    def __init__(self, startBalance):
+        self.startBalance = startBalance
+
+    @abstractmethod
+    def next_bet(self, balance, maxBet):
+        """Amount to bet next round, maxBet is the most the betting rules allow right now"""
+
+    def record(self, won):
+        """Called after every round with its result"""
+
+
+class Martingale(BettingStrategy):
+    name = "martingale"
+
+    def __init__(self, startBalance):
+        super().__init__(startBalance)
+        self.baseBet = max(int(startBalance * AUTOPLAY_BASE_BET), 1)
+        self.bet = self.baseBet
+
+    def next_bet(self, balance, maxBet):
+        return min(self.bet, maxBet)
+
+    def record(self, won):
+        # Double up after a loss so the next win covers everything lost, start over after a win
+        self.bet = self.baseBet if won else self.bet * 2
+
+
+class FixedFraction(BettingStrategy):
+    name = "fraction"
+
+    def next_bet(self, balance, maxBet):
+        return min(max(int(balance * AUTOPLAY_BET_FRACTION), 1), maxBet)
+
+
+class AllIn(BettingStrategy):
+    name = "allin"
+
+    def next_bet(self, balance, maxBet):
+        return maxBet
+
+
+STRATEGIES = {
+    "martingale": Martingale,
+    "m": Martingale,
+    "fraction": FixedFraction,
+    "fixed": FixedFraction,
+    "f": FixedFraction,
+    "allin": AllIn,
+    "all-in": AllIn,
+    "a": AllIn,
+}
+
+
+class AutoPlay:
+    """A batch of rounds bet by a strategy, along with how the batch went so far"""
+
+    def __init__(self, strategy, rounds, startBalance):
+        self.strategy = strategy
+        self.rounds = rounds
+        self.startBalance = startBalance
+        self.roundsPlayed = 0
+        self.roundsWon = 0
+        self.balance = startBalance
+
+    @classmethod
+    def from_command(cls, command, startBalance):
+        """Parse 'auto <strategy> [rounds]', raises ValueError when the command doesn't make sense"""
+        words = command.lower().split()
+        if len(words) not in (2, 3) or words[0] != "auto" or words[1] not in STRATEGIES:
+            raise ValueError(f"Invalid auto-play command: {command}")
+
+        rounds = int(words[2]) if len(words) == 3 else AUTOPLAY_DEFAULT_ROUNDS
+        if not 0 < rounds <= AUTOPLAY_MAX_ROUNDS:
+            raise ValueError(f"Auto-play rounds have to be between 1 and {AUTOPLAY_MAX_ROUNDS}.")
+        return cls(STRATEGIES[words[1]](startBalance), rounds, startBalance)
+
+    @property
+    def isFinished(self):
+        return self.roundsPlayed >= self.rounds
+
+    def record(self, won, balance):
+        self.roundsPlayed += 1
+        self.roundsWon += int(won)
+        self.balance = balance
+        self.strategy.record(won)
+
+    def progress_rows(self):
+        return (
+            f"Auto-play ({self.strategy.name}): {self.roundsPlayed}/{self.rounds} rounds",
+            f"Won {self.roundsWon}, lost {self.roundsPlayed - self.roundsWon}, net ${self.balance - self.startBalance:+}",
+        )
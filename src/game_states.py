@@ -1,266 +1,352 @@
 from src.settings import *
 from src.utils.utility import pos_int
-from src.main import CoinTossGame
+from src.autoplay import AutoPlay
 
-from abc import ABC, abstractmethod
+from abc import ABC
+from typing import TYPE_CHECKING
 import time
-from random import choice
+
+if TYPE_CHECKING:
+    from src.main import CoinTossGame
 
 
 class GameState(ABC):
-    playsIdleAnimation = True
+    layers = ("idle",) # Animation layers played while the state is active
+    prompts = () # Rows shown at the top of the main window while the state is active
+
+    def enter(self, game: "CoinTossGame"):
+        """Called every time the state becomes the active one, states are reused so reset per-visit data here"""
 
-    @abstractmethod
-    def render(self, game: CoinTossGame):
+    def render(self, game: "CoinTossGame"):
         """Render the Game State, updating the display"""
+        game.mainWin.set_static_rows(self.prompts)
 
-    def handle_input(self, game: CoinTossGame, userInput: str):
+    def handle_input(self, game: "CoinTossGame", userInput: str):
         """Handle user input for the spesific game state"""
 
-    def process(self, game: CoinTossGame):
+    def process(self, game: "CoinTossGame"):
         """Processes background logic (e.g., timers, animations)"""
-        if self.playsIdleAnimation:
-            game.idleAnimation.play()
+        game.compositor.set_active(self.layers)
+        game.compositor.tick()
 
 class TimedState(GameState):
-    def __init__(self, scheduledState = None, onTimerEnd = None):
+    def __init__(self, scheduledState = None):
         self.startTime = time.time()
         self.scheduledState = scheduledState
-        self.onTimerEnd = onTimerEnd
+
+    def enter(self, game):
+        self.startTime = time.time()
 
     def process(self, game):
         super().process(game)
 
         if time.time() - self.startTime > self.timerDuration:
             if self.scheduledState:
-                game.gameState = self.scheduledState
-            if self.onTimerEnd:
-                self.onTimerEnd()
-        
+                game.change_state(self.scheduledState)
+
 
 
 class CutSceneState(GameState):
-    def __init__(self, scheduledState, prompts, timerDuration = 0, waitForUserInput = False, onSceneEnd = None):
+    layers = ()
+
+    def __init__(self, scheduledState, prompts, timerDuration = 0, waitForUserInput = False, endsGame = False):
         self.startTime = time.time()
         self.scheduledState = scheduledState
         self.prompts = prompts
         self.timerDuration = timerDuration
-        self.onSceneEnd = onSceneEnd
+        self.endsGame = endsGame
         self.waitForUserInput = waitForUserInput
-    
+
+    def enter(self, game):
+        self.startTime = time.time()
+
     def process(self, game):
+        super().process(game)
+
         if self.timerDuration:
             if time.time() - self.startTime > self.timerDuration:
-                if self.scheduledState:
-                    game.gameState = self.scheduledState
-                if self.onSceneEnd:
-                    self.onSceneEnd()
-
-    def render(self, game):
-        for idx, prompt in enumerate(self.prompts):
-            game.mainWin.add_string(0, idx, prompt)
+                self.end_scene(game)
 
     def handle_input(self, game, userInput):
         if self.waitForUserInput:
-            if self.scheduledState:
-                game.gameState = self.scheduledState
-            if self.onSceneEnd:
-                    self.onSceneEnd()
+            self.end_scene(game)
+
+    def end_scene(self, game):
+        if self.scheduledState:
+            game.change_state(self.scheduledState)
+        if self.endsGame:
+            game.end_game()
 
 class ModeSelectState(GameState):
-    def render(self, game):
-            game.mainWin.add_string(0, 0, Prompt.WELCOME)
-            game.mainWin.add_string(0, 1, Prompt.SELECT_MODE)
-            game.mainWin.add_string(0, 2, "Write 'help' if you want additional information about the modes.")
-        
+    prompts = (Prompt.WELCOME, Prompt.SELECT_MODE, Prompt.MODE_HELP_HINT, Prompt.STATS_HINT)
+
     def handle_input(self, game, userInput):
-        match userInput: 
-                case mode if mode.lower() in ("easy", "e"):
-                    game.gameMode = GAME_MODES["easy"]
-                    game.playerBalance = game.gameMode.initialBalance
-                    game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.EASY_MODE_INTRO], timerDuration=2)
-                case mode if mode.lower() in ("moderate", "m"):
-                    game.gameMode = GAME_MODES["moderate"]
-                    game.playerBalance = game.gameMode.initialBalance
-                    game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.MODERATE_MODE_INTRO], timerDuration=2)
-                case mode if mode.lower() in ("hard", "h"):
-                    game.gameMode = GAME_MODES["hard"]
-                    game.playerBalance = game.gameMode.initialBalance
-                    game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.HARD_MODE_INTRO], timerDuration=2)
-                case mode if mode.lower() in ("intense", "i"):
-                    game.gameMode = GAME_MODES["intense"]
-                    game.playerBalance = game.gameMode.initialBalance
-                    game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.INTENSE_MODE_INTRO], timerDuration=2)
-                case command if command.lower() in ("help", "h"):
-                    game.gameState = CutSceneState(scheduledState=ModeSelectState(), prompts=[Prompt.MODE_INFO.format(name = GAME_MODES["easy"].name,
-                                                                                                initialBalance = GAME_MODES["easy"].initialBalance,
-                                                                                                goalMoney = GAME_MODES["easy"].goalMoneyAmount),
-                                                                        Prompt.MODE_INFO.format(name = GAME_MODES["moderate"].name,
-                                                                                                initialBalance = GAME_MODES["moderate"].initialBalance,
-                                                                                                goalMoney = GAME_MODES["moderate"].goalMoneyAmount),
-                                                                        Prompt.MODE_INFO.format(name = GAME_MODES["hard"].name,
-                                                                                                initialBalance = GAME_MODES["hard"].initialBalance,
-                                                                                                goalMoney = GAME_MODES["hard"].goalMoneyAmount),
-                                                                        Prompt.MODE_INFO.format(name = GAME_MODES["intense"].name,
-                                                                                                initialBalance = GAME_MODES["intense"].initialBalance,
-                                                                                                goalMoney = GAME_MODES["intense"].goalMoneyAmount)], waitForUserInput=True)
-                case _:
-                    game.gameState = CutSceneState(scheduledState=ModeSelectState(), prompts=[Prompt.INVALID_INPUT], timerDuration=1)
+        command = userInput.lower()
+        if command in MODE_SELECTIONS:
+            modeKey, introScene = MODE_SELECTIONS[command]
+            # Declining a saved game to start a new one ends it, that is the only time a session is recorded as left
+            if game.gameMode and game.roundsPlayed:
+                game.record_session()
+            game.gameMode = GAME_MODES[modeKey]
+            game.playerBalance = game.gameMode.initialBalance
+            # A loaded save can get here too (declining to continue it), nothing of it carries over to the new game
+            game.loanMode = False
+            game.gameOver = False
+            game.start_session()
+            game.change_state(introScene)
+        elif command == "help":
+            game.change_state("mode_help")
+        elif command in ("stats", "s"):
+            game.change_state("stats")
+        else:
+            game.change_state("invalid_mode")
+
+
+class StatsState(GameState):
+    layers = ()
+
+    def enter(self, game):
+        stats = game.stats
+        prompts = [Prompt.LEADERBOARD_HEADER]
+        for rank, entry in enumerate(stats.leaderboard, start = 1):
+            prompts.append(Prompt.LEADERBOARD_ENTRY.format(rank = rank, **entry))
+        if not stats.leaderboard:
+            prompts.append(Prompt.NO_SESSIONS)
+
+        prompts.append(Prompt.MODE_STATS_HEADER)
+        for mode in GAME_MODES.values():
+            if mode.name in stats.modes:
+                prompts.append(Prompt.MODE_STATS.format(mode = mode.name, winRate = stats.win_rate(mode.name), **stats.modes[mode.name]))
+        prompts.append(Prompt.STATS_BACK)
+        self.prompts = tuple(prompts)
+
+    def handle_input(self, game, userInput):
+        game.change_state("mode_select")
 
 
 class InitialBalanceState(GameState):
-    def render(self, game):
-        game.mainWin.add_string(0, 0, Prompt.WELCOME)
-        game.mainWin.add_string(0, 1, Prompt.MONEY_INPUT)
-    
+    prompts = (Prompt.WELCOME, Prompt.MONEY_INPUT)
+
     def handle_input(self, game, userInput):
         try:
             parsed = pos_int(userInput)
         except ValueError:
             parsed = userInput
-    
-        match parsed: 
+
+        match parsed:
                 case int(balance) if balance > 0:
                     game.playerBalance = balance
-                    if balance <= 1000:
-                        game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.POOR_PLAYER_INTRO], timerDuration=2)
-                    else:
-                        game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.RICH_PLAYER_INTRO], timerDuration=2)
+                    game.change_state("poor_player_intro" if balance <= 1000 else "rich_player_intro")
                 case _:
-                    game.gameState = CutSceneState(scheduledState=InitialBalanceState(), prompts=[Prompt.INVALID_INPUT], timerDuration=1)
-    
+                    game.change_state("invalid_balance")
+
 
 class WelcomeState(TimedState):
     timerDuration = 5
-    
-    def render(self, game):
-        game.mainWin.add_string(0, 0, Prompt.WELCOME)
+    prompts = (Prompt.WELCOME, Prompt.CONTINUE_GAME)
 
+    def render(self, game):
         if game.playerBalance is None: # If new game
-            game.gameState = ModeSelectState()
+            game.change_state("mode_select")
+            game.gameState.render(game)
 
         else:
-            game.mainWin.add_string(0, 1, Prompt.CONTINUE_GAME)
-    
+            super().render(game)
+
     def handle_input(self, game, userInput):
         match userInput:
                 case None:
                     ...
                 case command if command.lower() in NEGATIVE_PHRASES:
-                    game.gameState = ...
+                    game.change_state("mode_select")
                 case command if command.lower() in POSITIVE_PHRASES:
-                    game.gameState = ...
+                    game.change_state("game_menu")
                 case _:
-                    game.gameState = WelcomeState()
-    
+                    game.change_state("welcome")
+
 class GameMenuState(GameState):
-    def render(self, game):
-        game.mainWin.add_string(0, 0, Prompt.HOW_MUCH)
-    
+    prompts = (Prompt.HOW_MUCH, Prompt.AUTOPLAY_HINT)
+
     def handle_input(self, game, userInput):
         try:
             parsed = pos_int(userInput)
         except ValueError:
             parsed = userInput
-    
+
         match parsed:
-                case int(betAmount) if 0 < betAmount <= game.playerBalance - (game.gameMode.debtThreshold if game.loanMode else 0):
+                case int(betAmount):
                     # Update player balance and get to the prediction state
-                    game.playerBalance -= betAmount
-                    game.betAmount = betAmount
-                    game.gameState = PredictionState()
+                    if not game.place_bet(betAmount):
+                        game.change_state("invalid_bet")
+                        return
+                    game.autoPlay = None
+                    game.change_state("prediction")
+                case str(command) if command.lower().startswith("auto"):
+                    try:
+                        game.autoPlay = AutoPlay.from_command(command, game.playerBalance)
+                    except ValueError:
+                        game.change_state("invalid_bet")
+                        return
+                    game.change_state("auto_play")
                 case _:
-                    game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.INVALID_INPUT], timerDuration=1)
-    
+                    game.change_state("invalid_bet")
 
 
-    
 class PredictionState(GameState):
-    def render(self, game):
-        game.mainWin.add_string(0, 0, Prompt.ASK_CHOICE)
-    
+    prompts = (Prompt.ASK_CHOICE,)
+
     def handle_input(self, game, userInput):
-        match userInput:
-                case prediction if prediction.lower() in ("tails", "t"):
-                    game.gameState = CoinFlipState("tails")
-                case prediction if prediction.lower() in ("heads", "h"):
-                    game.gameState = CoinFlipState("heads")
-                case _:
-                    game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.INVALID_INPUT], timerDuration=1)
-    
+        game.change_state(PREDICTIONS.get(userInput.lower(), "invalid_bet"))
+
 class CoinFlipState(GameState):
+    prompts = (Prompt.COIN_FLIP,)
+    layers = ("coin_flip",)
+
     def __init__(self, playerPrediction):
         self.playerPrediction = playerPrediction
 
-    def render(self, game):
-        game.mainWin.add_string(0, 0, Prompt.COIN_FLIP)
-    
     def process(self, game):
-        game.coinFlipAnimation.play()
+        super().process(game)
 
         if not game.coinFlipAnimation.isFinished:
             return
 
-        result = choice(["heads", "tails"])
         game.coinFlipAnimation.reset()
+        _, nextState = game.flip_coin(self.playerPrediction)
+        game.change_state(nextState)
 
-        if result == self.playerPrediction:
-            game.playerBalance += game.betAmount * 2
 
-            if game.playerBalance >= game.gameMode.goalMoneyAmount:
-                game.gameOver = True
-                game.gameState = CutSceneState(
-                    scheduledState=None,
-                    prompts=[Prompt.GAME_WON.format(mode=game.gameMode.name)],
-                    timerDuration=3,
-                    onSceneEnd=game.end_game
-                )
-                return
+class AutoPlayState(GameState):
+    """Bets for the player with a strategy, several rounds per tick with the coin flip only spinning in the background"""
+    layers = ("coin_flip",)
 
-            game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.LUCKY_WINNER], timerDuration=1.5)
-            return
+    def enter(self, game):
+        autoPlay = game.autoPlay
+        self.prompts = (Prompt.AUTOPLAY_RUNNING.format(rounds = autoPlay.rounds, strategy = autoPlay.strategy.name), Prompt.AUTOPLAY_STOP_HINT)
 
-       # Wrong prediction
-        if game.loanMode:
-            # Check if player is still above debt threshold
-            if game.playerBalance > game.gameMode.debtThreshold:
-                game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.LOSS_MESSAGE], timerDuration=1.5)
-            else:
-                game.gameOver = True
-                game.gameState = CutSceneState(scheduledState=None, prompts=[Prompt.GAME_OVER], timerDuration=3, onSceneEnd=game.end_game)
-        else:
-            # Player has no more money and loans are disabled → offer loan
-            if game.playerBalance > 0:
-                game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.LOSS_MESSAGE], timerDuration=1.5)
-            else:
-                game.gameState = LoanOfferState()
+    def handle_input(self, game, userInput):
+        game.change_state("auto_play_done")
+
+    def process(self, game):
+        super().process(game)
+        if game.coinFlipAnimation.isFinished:
+            game.coinFlipAnimation.reset()
+
+        autoPlay = game.autoPlay
+        game.balanceDirty = True
+        for _ in range(AUTOPLAY_ROUNDS_PER_TICK):
+            if autoPlay.isFinished or not game.place_bet(autoPlay.strategy.next_bet(game.playerBalance, game.maxBet)):
+                game.change_state("auto_play_done")
+                return
+
+            won, nextState = game.flip_coin(autoPlay.strategy.prediction)
+            autoPlay.record(won, game.playerBalance)
+            # Winning the game, going broke or running out of loans goes through the usual scenes
+            if nextState not in AUTOPLAY_ROUND_OUTCOMES:
+                game.coinFlipAnimation.reset()
+                game.change_state(nextState)
+                return
 
 
 
 class LoanOfferState(GameState):
-    def render(self, game):
-        game.mainWin.add_string(0, 0, Prompt.ASK_LOAN_CHOICE)
-    
+    prompts = (Prompt.ASK_LOAN_CHOICE,)
+
     def handle_input(self, game, userInput):
         match userInput:
             case command if command.lower() in NEGATIVE_PHRASES:
                 game.gameOver = True
-                game.gameState = CutSceneState(scheduledState=None, prompts=[Prompt.GAME_OVER], timerDuration=1.5, onSceneEnd=game.end_game)
+                game.change_state("loan_declined")
             case command if command.lower() in POSITIVE_PHRASES:
                 game.loanMode = True
-                game.gameState = CutSceneState(scheduledState=GameMenuState(), prompts=[Prompt.LOANS_ENABLED], timerDuration=1.5)
+                game.change_state("loans_enabled")
             case _:
-                game.gameState = CutSceneState(scheduledState=LoanOfferState(), prompts=[Prompt.RETRY_INPUT], timerDuration=1.5)
+                game.change_state("loan_retry")
 
 
 class GameExitState(TimedState):
+    layers = ()
     timerDuration = 2
-    def render(self, game):
-        game.mainWin.add_string(0, 0, Prompt.LEAVE_GAME.format(balance = game.playerBalance))
-    
+
+    def enter(self, game):
+        super().enter(game)
+        self.prompts = (Prompt.LEAVE_GAME.format(balance = game.playerBalance),)
+
     def process(self, game):
+        GameState.process(self, game)
         if time.time() - self.startTime > self.timerDuration:
             # Change state when timer over
             game.end_game()
 
 
+# Transition tables, everything that can be computed ahead of time lives here so transitions are just lookups
+
+COIN_SIDES = ("heads", "tails")
+
+PREDICTIONS = {
+    "tails": "coin_flip_tails",
+    "t": "coin_flip_tails",
+    "heads": "coin_flip_heads",
+    "h": "coin_flip_heads",
+}
+
+# Input: (mode key, intro cut scene), "h" picks hard so help has to be typed out
+MODE_SELECTIONS = {
+    "easy": ("easy", "easy_intro"),
+    "e": ("easy", "easy_intro"),
+    "moderate": ("moderate", "moderate_intro"),
+    "m": ("moderate", "moderate_intro"),
+    "hard": ("hard", "hard_intro"),
+    "h": ("hard", "hard_intro"),
+    "intense": ("intense", "intense_intro"),
+    "i": ("intense", "intense_intro"),
+}
+
+MODE_INFO_PROMPTS = tuple(Prompt.MODE_INFO.format(name = mode.name, initialBalance = mode.initialBalance, goalMoney = mode.goalMoneyAmount)
+                          for mode in GAME_MODES.values())
+
+GAME_WON_SCENES = {mode.name: f"{key}_won" for key, mode in GAME_MODES.items()}
+
+AUTOPLAY_ROUND_OUTCOMES = ("lucky_winner", "loss") # Round results auto-play keeps going after
+
+# Name: (scheduled state, prompts, timer duration, wait for user input, ends game)
+CUT_SCENES = {
+    "easy_intro": ("game_menu", (Prompt.EASY_MODE_INTRO,), 2, False, False),
+    "moderate_intro": ("game_menu", (Prompt.MODERATE_MODE_INTRO,), 2, False, False),
+    "hard_intro": ("game_menu", (Prompt.HARD_MODE_INTRO,), 2, False, False),
+    "intense_intro": ("game_menu", (Prompt.INTENSE_MODE_INTRO,), 2, False, False),
+    "mode_help": ("mode_select", MODE_INFO_PROMPTS, 0, True, False),
+    "invalid_mode": ("mode_select", (Prompt.INVALID_INPUT,), 1, False, False),
+    "poor_player_intro": ("game_menu", (Prompt.POOR_PLAYER_INTRO,), 2, False, False),
+    "rich_player_intro": ("game_menu", (Prompt.RICH_PLAYER_INTRO,), 2, False, False),
+    "invalid_balance": ("initial_balance", (Prompt.INVALID_INPUT,), 1, False, False),
+    "invalid_bet": ("game_menu", (Prompt.INVALID_INPUT,), 1, False, False),
+    "lucky_winner": ("game_menu", (Prompt.LUCKY_WINNER,), 1.5, False, False),
+    "loss": ("game_menu", (Prompt.LOSS_MESSAGE,), 1.5, False, False),
+    "game_over": (None, (Prompt.GAME_OVER,), 3, False, True),
+    "loan_declined": (None, (Prompt.GAME_OVER,), 1.5, False, True),
+    "loans_enabled": ("game_menu", (Prompt.LOANS_ENABLED,), 1.5, False, False),
+    "loan_retry": ("loan_offer", (Prompt.RETRY_INPUT,), 1.5, False, False),
+    "auto_play_done": ("game_menu", (Prompt.AUTOPLAY_DONE,), 2, False, False),
+    **{scene: (None, (Prompt.GAME_WON.format(mode = modeName),), 3, False, True) for modeName, scene in GAME_WON_SCENES.items()},
+}
+
+
+def build_states():
+    """Create every state once, the game then switches between these instances by name"""
+    states = {
+        "welcome": WelcomeState(scheduledState = "game_menu"),
+        "mode_select": ModeSelectState(),
+        "stats": StatsState(),
+        "initial_balance": InitialBalanceState(),
+        "game_menu": GameMenuState(),
+        "prediction": PredictionState(),
+        "coin_flip_heads": CoinFlipState("heads"),
+        "coin_flip_tails": CoinFlipState("tails"),
+        "auto_play": AutoPlayState(),
+        "loan_offer": LoanOfferState(),
+        "game_exit": GameExitState(),
+    }
+    for name, (scheduledState, prompts, timerDuration, waitForUserInput, endsGame) in CUT_SCENES.items():
+        states[name] = CutSceneState(scheduledState, prompts, timerDuration, waitForUserInput, endsGame)
+    return states
@@ -2,12 +2,16 @@ from src.settings import *
 from src.ui.screen import *
 from src.game_states import *
 from src.utils.utility import write_dict_to_json, clear_file, pos_int
-from src.animation import AsciiAnimation
+from src.animation import AsciiAnimation, AnimationCompositor
+from src.utils.animation_file import AnimationFile
+from src.metrics import GameMetrics
+from src.stats import SessionStats
+from src.ui.bandwidth import QualityLevel, QUALITY_LABELS
 
-from os.path import join, getsize
+from os.path import join, getsize, exists
 import json
 import random
-from time import sleep
+from time import sleep, perf_counter
 
 class GameState(Enum):
     WELCOME = auto()
@@ -20,32 +24,47 @@ class GameState(Enum):
     GAME_OVER = auto()
 
 class CoinTossGame:
-    def __init__(self):
+    def __init__(self, screen = None, dataDir = (MAIN_DIR, "Data"), autoStart = True):
         self.debtThreshold = random.randint(-10000, -5000)
         self.playerBalance = None
+        self.gameMode = None
         self.betAmount = 0
-        self.coinAnimationFrames = self.load_animation(FileNames.COIN_ANIMATION_FILE)
-        self.idleAnimationFrames = self.load_animation(FileNames.IDLE_ANIMATION_FILE)
+        self.dataDir = dataDir
 
         self.running = True
         self.gameOver = False
         self._loanMode = False
-        self.gameState: GameState = WelcomeState(GameMenuState())
+        self._autoPlay = None
+        self.states = build_states()
+        self.change_state("welcome")
+        self.metrics = GameMetrics(*dataDir)
+        self.balanceDirty = True
+        self.shownBalance, self.shownOverlay = None, ()
+        self.qualityLevel = QualityLevel.FULL
 
         # Create UI
-        self.screen = Screen(dimensions = (200, 63))
+        self.screen = screen or Screen(dimensions = (200, 63))
         self.mainWin = Window(dimensions = (150, 60), beginningPoint = (0, 0), screen = self.screen)
         self.balanceWindow = Window(dimensions = (50, 3), beginningPoint = (151, 0), screen = self.screen)
         self.inputWin = InputWindow(dimensions = (150, 3), beginningPoint = (0, 60), screen = self.screen, maxInputLength = 150, startMode = "input")
+        self.resize_balance_window()
 
+        self.stats = SessionStats(*dataDir)
+        self.start_session()
         self.load_data()
 
         # Animations
-        self.coinFlipAnimation = AsciiAnimation(animationFrames=self.coinAnimationFrames, animationWindow=self.mainWin, topLeft=(10, 5), dimensions=(128, 55))
-        self.idleAnimation = AsciiAnimation(animationFrames=self.idleAnimationFrames, animationWindow=self.mainWin, topLeft=(15, 10), dimensions=(120, 40), playContinuously=True)
+        self.coinFlipAnimation = AsciiAnimation(animationFrames=self.load_animation(FileNames.COIN_ANIMATION_FILE), animationWindow=self.mainWin, topLeft=(10, 5), dimensions=(128, 55))
+        self.idleAnimation = AsciiAnimation(animationFrames=self.load_animation(FileNames.IDLE_ANIMATION_FILE), animationWindow=self.mainWin, topLeft=(15, 10), dimensions=(120, 40), playContinuously=True)
+
+        # Every animation is a layer of the compositor, states pick which layers play
+        self.compositor = AnimationCompositor(self.mainWin)
+        self.compositor.add_layer("idle", self.idleAnimation, z = 0)
+        self.compositor.add_layer("coin_flip", self.coinFlipAnimation, z = 1)
 
         # Start game
-        self.start_game()
+        if autoStart:
+            self.start_game()
 
 
     @property
@@ -55,45 +74,143 @@ class CoinTossGame:
     @loanMode.setter
     def loanMode(self, value):
         self._loanMode = bool(value)
-        if self._loanMode: self.balanceWindow.resize_window((50, 4))
-        
+        self.resize_balance_window()
+
+    @property
+    def autoPlay(self):
+        return self._autoPlay
+
+    @autoPlay.setter
+    def autoPlay(self, value):
+        self._autoPlay = value
+        self.resize_balance_window()
+
+    @property
+    def maxBet(self):
+        return self.playerBalance - (self.gameMode.debtThreshold if self.loanMode else 0)
+
+    def resize_balance_window(self):
+        self.balanceDirty = True
+        rows = 1 + int(self._loanMode) + int(ADAPTIVE_QUALITY) + (2 if self._autoPlay else 0) + (self.metrics.overlayRows if self.metrics.enabled else 0)
+        if rows != self.balanceWindow.height:
+            self.balanceWindow.resize_window((50, rows + 2))
+
+    def update_quality(self):
+        if not self.screen.bandwidth.evaluate(perf_counter(), self.screen.droppedFrames):
+            return
+        self.apply_quality(self.screen.bandwidth.level)
+
+    def apply_quality(self, level):
+        self.qualityLevel = level
+        self.balanceDirty = True
+        for layer in self.compositor.layers.values():
+            animation = layer.animation
+            animation.animationSpeed = min(animation.fps, REDUCED_ANIMATION_SPEED) if level >= QualityLevel.REDUCED_FPS else animation.fps
+            animation.set_reduced(level >= QualityLevel.REDUCED_SIZE)
+        self.idleAnimation.paused = level >= QualityLevel.IDLE_PAUSED
+
+    def toggle_metrics(self):
+        self.metrics.toggle()
+        self.resize_balance_window()
+
+
+    def change_state(self, stateName):
+        self.gameState = self.states[stateName]
+        self.gameState.enter(self)
+
+    def place_bet(self, betAmount):
+        """Take the bet out of the balance, returns False when the betting rules don't allow it"""
+        if not 0 < betAmount <= self.maxBet:
+            return False
+        self.playerBalance -= betAmount
+        self.betAmount = betAmount
+        return True
+
+    def flip_coin(self, prediction):
+        """Settle the placed bet, returns whether it was won and the state the round leads to"""
+        self.roundsPlayed += 1
+        if random.choice(COIN_SIDES) == prediction:
+            self.playerBalance += self.betAmount * 2
+            self.peakBalance = max(self.peakBalance, self.playerBalance)
+
+            if self.playerBalance >= self.gameMode.goalMoneyAmount:
+                self.gameOver = True
+                return True, GAME_WON_SCENES[self.gameMode.name]
+            return True, "lucky_winner"
+
+        # Wrong prediction
+        if self.loanMode:
+            # Check if player is still above debt threshold
+            if self.playerBalance > self.gameMode.debtThreshold:
+                return False, "loss"
+            self.gameOver = True
+            return False, "game_over"
+
+        # Player has no more money and loans are disabled → offer loan
+        return False, "loss" if self.playerBalance > 0 else "loan_offer"
 
     def load_data(self):
-        fullPath = join(MAIN_DIR, "Data", FileNames.DATA_FILE)
-        if getsize(fullPath):
+        fullPath = join(*self.dataDir, FileNames.DATA_FILE)
+        if exists(fullPath) and getsize(fullPath):
             with open(fullPath, "r") as f:
                 data = json.load(f)
                 self.gameMode = GameMode.from_dict(data["gameMode"])
                 self.playerBalance = data["playerBalance"]
                 self.loanMode = data["_loanMode"]
+                # The session goes on where the last launch left it, saves from before sessions were kept start fresh
+                session = data.get("session", {})
+                self.start_session(session.get("roundsPlayed", 0), session.get("peakBalance"), session.get("duration", 0))
         
     def load_animation(self, fileName):
-        animationFrames = []
-        frame = []
-        full_path = join(MAIN_DIR, "Animations", fileName)    
-        with open(full_path, "r") as f:
-            lines = f.readlines()
-            for line in lines:
-                if line.isspace():
-                    animationFrames.append(frame)
-                    frame = []
-                else:
-                    frame.append(line.strip())
-
-        return animationFrames
+        animationFile = AnimationFile(join(MAIN_DIR, "Animations", fileName))
+        # Huge animations are streamed while playing, the rest is read frame by frame and kept in memory
+        if getsize(animationFile.path) > STREAM_ANIMATION_SIZE:
+            return animationFile
+        return animationFile.frames()
+
+    def start_session(self, roundsPlayed = 0, peakBalance = None, duration = 0):
+        """Start counting a session, a resumed save passes in what was counted before"""
+        self.sessionStart = perf_counter() - duration
+        self.roundsPlayed = roundsPlayed
+        self.peakBalance = peakBalance if peakBalance is not None else (self.playerBalance or 0)
+
+    @property
+    def sessionDuration(self):
+        return round(perf_counter() - self.sessionStart, 1)
+
+    def record_session(self):
+        if not self.gameOver:
+            outcome = "left"
+        else:
+            outcome = "won" if self.playerBalance >= self.gameMode.goalMoneyAmount else "lost"
+
+        self.stats.record({
+            "mode": self.gameMode.name,
+            "rounds": self.roundsPlayed,
+            "peakBalance": self.peakBalance,
+            "usedLoan": self.loanMode,
+            "outcome": outcome,
+            "duration": self.sessionDuration,
+        })
 
     def end_game(self):
+        # A session is recorded once, when it is won or lost, leaving saves it to be continued next launch
+        if self.gameOver:
+            self.record_session()
+
         if not self.gameOver: 
-            # Exclude some keys from self.__dict__
-            includedKeys = {"playerBalance", "_loanMode"}  # Add any keys you want to save
-            filteredDict = {k: v for k, v in self.__dict__.items() if k in includedKeys}
+            # Nothing to save if no mode was picked yet
             if self.gameMode:
+                # Exclude some keys from self.__dict__
+                includedKeys = {"playerBalance", "_loanMode"}  # Add any keys you want to save
+                filteredDict = {k: v for k, v in self.__dict__.items() if k in includedKeys}
                 filteredDict["gameMode"] = self.gameMode.to_dict()
+                filteredDict["session"] = {"roundsPlayed": self.roundsPlayed, "peakBalance": self.peakBalance, "duration": self.sessionDuration}
 
-            write_dict_to_json(filteredDict, MAIN_DIR, "Data", "database.json")
+                write_dict_to_json(filteredDict, *self.dataDir, FileNames.DATA_FILE)
         
         else: 
-            clear_file(MAIN_DIR, "Data", "database.json")
+            clear_file(*self.dataDir, FileNames.DATA_FILE)
         self.running = False
 
 
@@ -101,27 +218,57 @@ class CoinTossGame:
         if isinstance(input, str): self.gameState.handle_input(self, input)
 
     def render_balance(self):
-        self.balanceWindow.add_string(0, 0, "Current Balance: " + (f"${self.playerBalance}" if self.playerBalance is not None else "$0"))
+        overlayLines = self.metrics.overlay_lines() if self.metrics.enabled else ()
+        # Only rebuild the rows when something shown in them changed
+        if not self.balanceDirty and self.playerBalance == self.shownBalance and overlayLines is self.shownOverlay:
+            return
+
+        self.balanceDirty = False
+        self.shownBalance, self.shownOverlay = self.playerBalance, overlayLines
+        rows = ["Current Balance: " + (f"${self.playerBalance}" if self.playerBalance is not None else "$0")]
         if self.loanMode:
-            self.balanceWindow.add_string(0, 1, f"Debt Threshold: ${self.gameMode.debtThreshold}")
+            rows.append(f"Debt Threshold: ${self.gameMode.debtThreshold}")
+        if ADAPTIVE_QUALITY:
+            rows.append(f"Output Quality: {QUALITY_LABELS[self.qualityLevel]}")
+        if self._autoPlay:
+            rows.extend(self._autoPlay.progress_rows())
+        rows.extend(overlayLines)
+        self.balanceWindow.set_static_rows(tuple(rows))
 
     def update_display(self):
         self.mainWin.clear_strings()
         self.balanceWindow.clear_strings()
         # logging.debug(f"{self.gameState}")
-        self.gameState.process(self)
-        self.gameState.render(self)
-        self.render_balance()
+        measure = self.metrics.measure
+        measure("process", self.gameState.process, self)
+        measure("render", self.gameState.render, self)
+        measure("balance", self.render_balance)
+
+    def process_events(self):
+        for event in self.screen.events:
+            if event == Events.EXIT:
+                self.change_state("game_exit")
+            elif event == Events.TOGGLE_METRICS:
+                self.toggle_metrics()
+        self.handle_input(self.inputWin.userInput)
 
     def start_game(self):
-        while self.running:
-            self.update_display()
-            for event in self.screen.events:
-                if event == Events.EXIT:
-                    self.gameState = GameExitState()
-            self.handle_input(self.inputWin.userInput)
-            self.screen.update()
-            sleep(0.016)
+        try:
+            while self.running:
+                frameStart = perf_counter()
+                self.update_display()
+                self.metrics.measure("input", self.process_events)
+                self.metrics.measure("screen", self.screen.update)
+                if ADAPTIVE_QUALITY:
+                    self.update_quality()
+                sleep(0.016)
+
+                if self.metrics.enabled:
+                    droppedFrames = sum(layer.animation.droppedFrames for layer in self.compositor.layers.values())
+                    self.metrics.record_frame(perf_counter() - frameStart, droppedFrames, self.screen.bytesWritten)
+        finally:
+            # Give the terminal back even when something crashed, otherwise the traceback is unreadable
+            self.screen.end()
             
 
 if __name__ == "__main__":
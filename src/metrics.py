@@ -0,0 +1,105 @@
+from src.settings import *
+from src.utils.utility import write_dict_to_json
+
+from bisect import bisect_left
+from time import perf_counter
+
+
+class GameMetrics:
+    """Collects main loop timings, only doing work while enabled"""
+
+    def __init__(self, *dataDir, dumpInterval = METRICS_DUMP_INTERVAL):
+        self.dataDir = dataDir
+        self.enabled = False
+        self.dumpInterval = dumpInterval
+        self.reset()
+
+    def reset(self):
+        self.phaseTotals = dict.fromkeys(METRIC_PHASES, 0.0)
+        self.phasePeaks = dict.fromkeys(METRIC_PHASES, 0.0)
+        self.frameCount = 0
+        self.frameTimeTotal = 0.0
+        self.frameHistogram = [0] * (len(FRAME_TIME_BUCKETS) + 1) # Last bucket holds the slower frames
+        self.droppedFrames = 0
+        self.bytesWritten = 0
+        self.counterBaseline = None # Producer counters are cumulative, so remember where we started
+
+        self.startTime = perf_counter()
+        self.lastDump = self.lastOverlayRefresh = self.startTime
+        self._overlayLines = []
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        if self.enabled:
+            self.reset()
+        return self.enabled
+
+    def measure(self, phase, func, *args):
+        if not self.enabled:
+            return func(*args)
+
+        start = perf_counter()
+        result = func(*args)
+        elapsed = perf_counter() - start
+
+        self.phaseTotals[phase] += elapsed
+        if elapsed > self.phasePeaks[phase]:
+            self.phasePeaks[phase] = elapsed
+        return result
+
+    def record_frame(self, frameTime, droppedFrames, bytesWritten):
+        """Record a finished loop iteration along with the cumulative dropped frame and byte counters"""
+        if self.counterBaseline is None:
+            self.counterBaseline = (droppedFrames, bytesWritten)
+
+        self.frameCount += 1
+        self.frameTimeTotal += frameTime
+        self.frameHistogram[bisect_left(FRAME_TIME_BUCKETS, frameTime * 1000)] += 1
+        self.droppedFrames = droppedFrames - self.counterBaseline[0]
+        self.bytesWritten = bytesWritten - self.counterBaseline[1]
+
+        now = perf_counter()
+        if now - self.lastDump >= self.dumpInterval:
+            self.lastDump = now
+            self.dump()
+
+    @property
+    def overlayRows(self):
+        return len(METRIC_PHASES) + 5
+
+    def overlay_lines(self):
+        now = perf_counter()
+        if self._overlayLines and now - self.lastOverlayRefresh < METRICS_OVERLAY_REFRESH:
+            return self._overlayLines
+
+        self.lastOverlayRefresh = now
+        frames = max(self.frameCount, 1)
+        elapsed = max(now - self.startTime, 1e-9)
+
+        lines = ["Metrics (Ctrl+P to hide)",
+                 f"Frames: {self.frameCount}  avg {self.frameTimeTotal / frames * 1000:.1f}ms  {self.frameCount / elapsed:.1f} fps"]
+        for phase in METRIC_PHASES:
+            lines.append(f"{phase:<8} avg {self.phaseTotals[phase] / frames * 1000:7.3f}ms  max {self.phasePeaks[phase] * 1000:7.3f}ms")
+
+        bucketLabels = [f"<{bound}" for bound in FRAME_TIME_BUCKETS] + [f"{FRAME_TIME_BUCKETS[-1]}+"]
+        lines.append("ms " + " ".join(bucketLabels))
+        lines.append("   " + " ".join(f"{count:>{len(label)}}" for label, count in zip(bucketLabels, self.frameHistogram)))
+        lines.append(f"Dropped anim frames: {self.droppedFrames}  Bytes: {self.bytesWritten / elapsed / 1024:.1f}KB/s")
+
+        self._overlayLines = lines
+        return lines
+
+    def to_dict(self):
+        frames = max(self.frameCount, 1)
+        return {
+            "elapsed": perf_counter() - self.startTime,
+            "frames": self.frameCount,
+            "averageFrameTime": self.frameTimeTotal / frames,
+            "phases": {phase: {"average": self.phaseTotals[phase] / frames, "max": self.phasePeaks[phase]} for phase in METRIC_PHASES},
+            "frameTimeHistogram": dict(zip([str(bound) for bound in FRAME_TIME_BUCKETS] + ["inf"], self.frameHistogram)),
+            "droppedAnimationFrames": self.droppedFrames,
+            "bytesWritten": self.bytesWritten,
+        }
+
+    def dump(self):
+        write_dict_to_json(self.to_dict(), *self.dataDir, FileNames.METRICS_FILE)
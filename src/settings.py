@@ -17,6 +17,8 @@ class Prompt(StrEnum):
     MODERATE_MODE_INTRO = "Okay, we're playing it safe. Anyway let's get tossin the coins!"
     INTENSE_MODE_INTRO = "INTENSE is no joke my boy, but it's your choice. Anyway let's get tossin the coins!"
     HARD_MODE_INTRO = "It's gonna be a challenge, be ready my boy. Anyway let's get tossin the coins!"
+    POOR_PLAYER_INTRO = "Not much in that wallet huh, every fortune starts somewhere. Anyway let's get tossin the coins!"
+    RICH_PLAYER_INTRO = "Look at you, a real big spender. Anyway let's get tossin the coins!"
     INVALID_INPUT = "You can't trick me you little prick."
     ASK_CHOICE = "Heads or tails son: [H/T]"
     LUCKY_WINNER = "You lucky little son of a bitch. Promise is promise I am doubling your money now."
@@ -26,6 +28,10 @@ class Prompt(StrEnum):
     CONTINUE_GAME = "Welcome back sir, let's continue playing shall we!"
     DOUBLE_OR_NOTHING = "Do you want to double or nothing with your ${balance}:"
     HOW_MUCH = "How much money do you want to double or nothing with?"
+    AUTOPLAY_HINT = "Or write 'auto <martingale/fraction/allin> [rounds]' and let a strategy do the betting for you."
+    AUTOPLAY_RUNNING = "Auto-playing {rounds} rounds with the {strategy} strategy, sit back and watch the money move."
+    AUTOPLAY_STOP_HINT = "Press Enter to stop early."
+    AUTOPLAY_DONE = "Auto-play is over, see how it went next to your balance."
     LEAVE_GAME = "Leaving the game with a current balance of ${balance}, this amount will automatically be saved for your next game."
     GAME_OVER = "Unfortunately the saga ends here my guy, come again when you have money."
     CREDIT_PREPOSITION = "Looks like somebody's out of dollars! Would you want to capitalize on the casino's credit system, don't forget this will be your debt so don't exaggerate!" \
@@ -33,6 +39,14 @@ class Prompt(StrEnum):
     ASK_LOAN_CHOICE = "Looks like someone's broooke, would you like to continue on playing with loans or leave with your honor?"
     LOANS_ENABLED = "Ho hooo, we have a real gambling addict over here. Let's continue tossing 'em coins then!"
     SELECT_MODE = "What mode do you want to play in? [Easy, Moderate, Hard, Intense]"
+    MODE_HELP_HINT = "Write 'help' if you want additional information about the modes."
+    STATS_HINT = "Write 'stats' to see the leaderboard and how everyone did in each mode."
+    LEADERBOARD_HEADER = "Leaderboard, best balances ever reached:"
+    LEADERBOARD_ENTRY = "{rank:>2}. ${peakBalance:<8} {mode:<9} {outcome}, {rounds} rounds"
+    NO_SESSIONS = "Nobody has played yet, be the first one!"
+    MODE_STATS_HEADER = "Modes:"
+    MODE_STATS = "{mode:<9} {won} won, {lost} lost ({winRate:.0%} won), {left} abandoned, {rounds} rounds, {loanSessions} with loans, best ${bestPeak}"
+    STATS_BACK = "Press Enter to go back."
     MODE_INFO = "{name}: Initial Balance = {initialBalance}, Goal Money = {goalMoney}"
     GAME_WON = "Holy moly, that was a good run, you have completed the {mode} level. I am proud of you son. Hope to see you again one time!"
 
@@ -41,6 +55,9 @@ class FileNames(StrEnum):
     COIN_ANIMATION_FILE = "coin_flip_animation.txt"
     IDLE_ANIMATION_FILE =  "idle_animation.txt"
     DATA_FILE = "database.json"
+    METRICS_FILE = "metrics.json"
+    SESSIONS_FILE = "sessions.jsonl"
+    STATS_FILE = "stats.json"
 
 class GameMode:
     def __init__(self, name, debtThreshold, goalMoneyAmount, initialBalance = None):
@@ -71,6 +88,44 @@ POSITIVE_PHRASES = ("yes", "y")
 
 MAIN_DIR = dirname(dirname(abspath(__file__))) # Gets the main folder
 
+# Output
+ASYNC_OUTPUT = True # Draw frames on a separate writer thread so a slow terminal doesn't stall the game loop
+# With async output, keys are read straight from stdin on the game loop so a slow flush can't delay them.
+# Windows has no select on the console, there keys are read through curses by the writer thread between draws
+# and input still waits for output on a slow link.
+KEY_POLL_INTERVAL = 0.005 # Seconds the writer thread waits for a frame before checking for keys again (Windows only)
+
+# Adaptive quality, output is degraded step by step when the terminal can't keep up
+ADAPTIVE_QUALITY = True
+BANDWIDTH_SAMPLE_INTERVAL = 1 # Seconds between output load samples
+DEGRADE_LOAD = 0.7 # Fraction of time spent writing to the terminal that triggers a lower quality
+DEGRADE_DROP_RATIO = 0.2 # Fraction of frames dropped by the writer that triggers a lower quality
+RESTORE_LOAD = 0.25 # Writing load the terminal has to stay under before quality goes back up
+RESTORE_SAMPLES = 3 # Calm samples in a row needed to go back up a level
+
+# Animations
+ANIMATION_SPEED = 15 # Frames per second
+REDUCED_ANIMATION_SPEED = 8 # Frames per second on slow terminals
+REDUCED_ANIMATION_SCALE = 0.6 # Size of the cropped animations on slow terminals
+STREAM_ANIMATION_SIZE = 16 * 1024 * 1024 # Animation files larger than this (in bytes) are read from disk while playing
+
+# Auto-play
+AUTOPLAY_ROUNDS_PER_TICK = 10 # Rounds settled every game loop iteration
+AUTOPLAY_DEFAULT_ROUNDS = 100
+AUTOPLAY_MAX_ROUNDS = 10000
+AUTOPLAY_BASE_BET = 0.01 # Martingale starting bet, as a fraction of the balance auto-play started with
+AUTOPLAY_BET_FRACTION = 0.1 # Fraction of the balance bet every round by the fixed fraction strategy
+
+# Statistics
+LEADERBOARD_SIZE = 10
+
+# Instrumentation
+METRIC_PHASES = ("process", "render", "balance", "screen", "input")
+FRAME_TIME_BUCKETS = (8, 16, 33, 50, 100) # Upper bounds of the frame time histogram buckets (in ms)
+METRICS_DUMP_INTERVAL = 5 # Seconds between metrics file dumps
+METRICS_OVERLAY_REFRESH = 0.5 # Seconds between overlay text refreshes
+ANIMATION_RESUME_GAP = 0.5 # Gaps between animation plays longer than this are pauses, not dropped frames
+
 GAME_MODES = {
     "easy": GameMode("Easy", initialBalance=1000, debtThreshold=randint(-5000, -4000), goalMoneyAmount=4000),
     "moderate": GameMode("Moderate", initialBalance=1000, debtThreshold=randint(-4000, -3000), goalMoneyAmount=7500),
@@ -0,0 +1,86 @@
+from src.settings import *
+from src.utils.utility import write_dict_to_json, append_json_line
+
+from os.path import exists, getsize
+import json
+
+
+class SessionStats:
+    """Append-only log of finished sessions, with aggregates kept next to it so reading stats never rescans the log"""
+
+    def __init__(self, *dataDir):
+        self.dataDir = dataDir
+        self.logPath = join(*dataDir, FileNames.SESSIONS_FILE)
+        self.load()
+
+    def reset(self):
+        self.modes = {} # Mode name: aggregates of that mode
+        self.leaderboard = [] # Best sessions by peak balance, highest first
+        self.logSize = 0 # Bytes of the log that are already counted in the aggregates
+
+    def load(self):
+        self.reset()
+        aggregatesPath = join(*self.dataDir, FileNames.STATS_FILE)
+        if exists(aggregatesPath) and getsize(aggregatesPath):
+            try:
+                with open(aggregatesPath, "r") as f:
+                    data = json.load(f)
+                self.modes, self.leaderboard, self.logSize = data["modes"], data["leaderboard"], data["logSize"]
+            except (ValueError, KeyError):
+                self.reset()
+
+        # The log size tells how much of it the aggregates cover, only the missing tail has to be replayed
+        logSize = getsize(self.logPath) if exists(self.logPath) else 0
+        if logSize < self.logSize:
+            self.reset()
+        if logSize != self.logSize:
+            self.replay_log()
+            self.save()
+
+    def replay_log(self):
+        with open(self.logPath, "rb") as f:
+            f.seek(self.logSize)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break # Half written line, leave it for the next load
+                try:
+                    self.add_to_aggregates(json.loads(line))
+                except ValueError:
+                    pass
+                self.logSize += len(line)
+
+    def save(self):
+        write_dict_to_json({"modes": self.modes, "leaderboard": self.leaderboard, "logSize": self.logSize}, *self.dataDir, FileNames.STATS_FILE)
+
+    def record(self, session):
+        """Append a finished session (mode, rounds, peakBalance, usedLoan, outcome, duration) and update the aggregates"""
+        self.logSize += append_json_line(session, *self.dataDir, FileNames.SESSIONS_FILE)
+        self.add_to_aggregates(session)
+        self.save()
+
+    def add_to_aggregates(self, session):
+        modeStats = self.modes.setdefault(session["mode"], {
+            "sessions": 0, "won": 0, "lost": 0, "left": 0, "rounds": 0, "loanSessions": 0, "bestPeak": 0, "duration": 0,
+        })
+        modeStats["sessions"] += 1
+        modeStats[session["outcome"]] += 1
+        modeStats["rounds"] += session["rounds"]
+        modeStats["loanSessions"] += int(session["usedLoan"])
+        modeStats["bestPeak"] = max(modeStats["bestPeak"], session["peakBalance"])
+        modeStats["duration"] += session["duration"]
+
+        # The leaderboard is capped, so keeping it sorted on insert stays cheap
+        if len(self.leaderboard) < LEADERBOARD_SIZE or session["peakBalance"] > self.leaderboard[-1]["peakBalance"]:
+            entry = {key: session[key] for key in ("mode", "peakBalance", "rounds", "outcome")}
+            idx = len(self.leaderboard)
+            while idx and self.leaderboard[idx - 1]["peakBalance"] < entry["peakBalance"]:
+                idx -= 1
+            self.leaderboard.insert(idx, entry)
+            del self.leaderboard[LEADERBOARD_SIZE:]
+
+    def win_rate(self, modeName):
+        """Share of finished (won or lost) sessions that were won, abandoned ones don't count"""
+        modeStats = self.modes.get(modeName)
+        if not modeStats or not modeStats["won"] + modeStats["lost"]:
+            return 0.0
+        return modeStats["won"] / (modeStats["won"] + modeStats["lost"])
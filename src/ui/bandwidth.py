@@ -0,0 +1,70 @@
+from src.settings import *
+
+from enum import IntEnum
+
+
+class QualityLevel(IntEnum):
+    FULL = 0
+    REDUCED_FPS = 1
+    REDUCED_SIZE = 2
+    IDLE_PAUSED = 3
+
+QUALITY_LABELS = {
+    QualityLevel.FULL: "Full",
+    QualityLevel.REDUCED_FPS: "Lower fps",
+    QualityLevel.REDUCED_SIZE: "Smaller animations",
+    QualityLevel.IDLE_PAUSED: "Idle animation paused",
+}
+
+
+class BandwidthMonitor:
+    """Measures how busy terminal output keeps the drawing side and picks a quality level from it"""
+
+    def __init__(self):
+        self.level = QualityLevel.FULL
+
+        # Cumulative counters, only ever increased by the drawing side so no locking is needed
+        self.writeTime = 0.0
+        self.framesDrawn = 0
+
+        self.lastSample = None # (time, write time, frames drawn, dropped frames) at the previous evaluation
+        self.calmSamples = 0
+
+    def record_write(self, seconds):
+        self.writeTime += seconds
+        self.framesDrawn += 1
+
+    def evaluate(self, now, droppedFrames):
+        """Take a sample every BANDWIDTH_SAMPLE_INTERVAL seconds, returns True when the level changed"""
+        sample = (now, self.writeTime, self.framesDrawn, droppedFrames)
+        if self.lastSample is None:
+            self.lastSample = sample
+            return False
+
+        elapsed = now - self.lastSample[0]
+        if elapsed < BANDWIDTH_SAMPLE_INTERVAL:
+            return False
+
+        writeTime, drawn, dropped = (current - previous for current, previous in zip(sample[1:], self.lastSample[1:]))
+        self.lastSample = sample
+
+        load = writeTime / elapsed
+        dropRatio = dropped / max(drawn + dropped, 1)
+
+        if load > DEGRADE_LOAD or dropRatio > DEGRADE_DROP_RATIO:
+            self.calmSamples = 0
+            if self.level < QualityLevel.IDLE_PAUSED:
+                self.level = QualityLevel(self.level + 1)
+                return True
+            return False
+
+        if load < RESTORE_LOAD and not dropped:
+            self.calmSamples += 1
+            # Wait for a few calm samples in a row so a short lull doesn't make the quality flicker
+            if self.calmSamples >= RESTORE_SAMPLES and self.level > QualityLevel.FULL:
+                self.calmSamples = 0
+                self.level = QualityLevel(self.level - 1)
+                return True
+        else:
+            self.calmSamples = 0
+        return False
@@ -0,0 +1,77 @@
+from src.ui.screen import Screen
+
+import curses
+
+
+class GridWindow:
+    """Stand-in for a curses window that writes into the character grid of a HeadlessScreen"""
+
+    def __init__(self, screen, height, width, y, x):
+        self.screen = screen
+        self.height, self.width = height, width
+        self.y, self.x = y, x
+        self.rows = [[" "] * width for _ in range(height)]
+
+    def erase(self):
+        for row in self.rows:
+            row[:] = " " * self.width
+
+    def box(self):
+        self.rows[0][:] = "+" + "-" * (self.width - 2) + "+"
+        self.rows[-1][:] = "+" + "-" * (self.width - 2) + "+"
+        for row in self.rows[1:-1]:
+            row[0] = row[-1] = "|"
+
+    def addnstr(self, y, x, text, n):
+        # Same rules as curses, text continues on the next row and writing past the last cell is an error
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("addnstr() returned ERR")
+        for char in text[:max(n, 0)]:
+            if y >= self.height:
+                raise curses.error("addnstr() returned ERR")
+            self.rows[y][x] = char
+            x += 1
+            if x == self.width:
+                y, x = y + 1, 0
+
+    def noutrefresh(self):
+        grid = self.screen.grid
+        width = min(self.width, self.screen.width - self.x)
+        for rowIdx, row in enumerate(self.rows[:max(self.screen.height - self.y, 0)]):
+            grid[self.y + rowIdx][self.x:self.x + width] = row[:width]
+
+    def nodelay(self, flag):
+        pass
+
+    def getch(self):
+        return -1
+
+    def move(self, y, x):
+        pass
+
+
+class HeadlessScreen(Screen):
+    """Screen that draws into an in-memory grid instead of a terminal, frames are drawn right away on update"""
+
+    def __init__(self, dimensions):
+        super().__init__(dimensions, asyncOutput = False)
+
+    def init_terminal(self):
+        self.grid = [[" "] * self.width for _ in range(self.height)]
+        self.cursor = None
+
+    def new_window(self, geometry):
+        return GridWindow(self, *geometry)
+
+    def show_cursor(self):
+        pass
+
+    def update_terminal(self, cursor):
+        self.cursor = cursor
+
+    def close_terminal(self):
+        pass
+
+    def snapshot(self):
+        """Text of the whole screen as it was last drawn"""
+        return "\n".join("".join(row) for row in self.grid)
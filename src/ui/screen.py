@@ -1,17 +1,106 @@
 from src.settings import *
+from src.ui.writer import TerminalWriter
+from src.ui.bandwidth import BandwidthMonitor
 
+from collections import deque
 from dataclasses import dataclass
 from textwrap import wrap
 from enum import Enum, auto
+from time import perf_counter
+from select import select
 import curses
+import os
 
-@dataclass
+@dataclass(slots = True)
 class PositionedString:
     x: int
     y: int
     val: str
     wrap: bool = True
 
+class RenderBuffer:
+    """Strings to draw in one frame, kept in parallel lists whose slots get reused by the next frame"""
+    __slots__ = ("xs", "ys", "vals", "wraps", "count")
+
+    def __init__(self):
+        self.xs, self.ys, self.vals, self.wraps = [], [], [], []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, x, y, val, wrap = True):
+        idx = self.count
+        if idx == len(self.vals):
+            self.xs.append(x)
+            self.ys.append(y)
+            self.vals.append(val)
+            self.wraps.append(wrap)
+        else:
+            self.xs[idx] = x
+            self.ys[idx] = y
+            self.vals[idx] = val
+            self.wraps[idx] = wrap
+        self.count = idx + 1
+
+    def clear(self):
+        self.count = 0
+
+class DrawList:
+    """Final addnstr calls of a window for one frame, laid out like RenderBuffer"""
+    __slots__ = ("ys", "xs", "texts", "lengths", "count")
+
+    def __init__(self):
+        self.ys, self.xs, self.texts, self.lengths = [], [], [], []
+        self.count = 0
+
+    def add(self, y, x, text, length):
+        idx = self.count
+        if idx == len(self.texts):
+            self.ys.append(y)
+            self.xs.append(x)
+            self.texts.append(text)
+            self.lengths.append(length)
+        else:
+            self.ys[idx] = y
+            self.xs[idx] = x
+            self.texts[idx] = text
+            self.lengths[idx] = length
+        self.count = idx + 1
+
+    def clear(self):
+        self.count = 0
+
+class Frame:
+    """Snapshot of every window handed from the game loop to the drawing side"""
+    __slots__ = ("drawLists", "geometries", "cursor")
+
+    def __init__(self):
+        self.drawLists = []
+        self.geometries = []
+        self.cursor = None
+
+def decode_keys(data):
+    """Turn raw terminal bytes into the key codes InputWindow handles, escape sequences (arrows etc.) are dropped"""
+    keys = []
+    idx = 0
+    while idx < len(data):
+        byte = data[idx]
+        idx += 1
+        if byte != 27:
+            keys.append(byte)
+        elif idx == len(data):
+            keys.append(27) # A lone ESC, sequences arrive in one read
+        elif data[idx] in b"[O":
+            # Skip parameters up to the final byte of the sequence
+            idx += 1
+            while idx < len(data) and not 0x40 <= data[idx] <= 0x7E:
+                idx += 1
+            idx += 1
+        else:
+            idx += 1 # Alt + key
+    return keys
+
 class Modes(Enum):
     STRING_MODE = auto()
     INPUT_MODE = auto()
@@ -19,12 +108,45 @@ class Modes(Enum):
 class Events(Enum):
     EXIT = auto()
     INPUT_RECIEVED = auto()
+    TOGGLE_METRICS = auto()
 
 
 class Screen:
-    def __init__(self, dimensions):
+    def __init__(self, dimensions, asyncOutput = ASYNC_OUTPUT):
         self.width, self.height = dimensions
+        self.init_terminal()
+
+        self.elements = []
+        self._events = []
+        self.bytesWritten = 0 # Characters handed to curses, curses itself may send less after diffing
+
+        self.keys = deque() # Key codes read from the terminal, waiting for the input window
+        self.keySource = None # Window whose getch is used to read keys
+        # Drawing happens on the writer thread, reading stdin directly keeps keys away from curses (see KEY_POLL_INTERVAL)
+        self.readsStdin = asyncOutput and os.name == "posix"
+
+        # Three frames are enough, one being drawn, one waiting and one being filled by the game loop
+        self.freeFrames = deque(Frame() for _ in range(3))
+        self.writer = TerminalWriter(self) if asyncOutput else None
+        self.bandwidth = BandwidthMonitor()
+        if self.writer:
+            self.writer.start()
+
+    @property
+    def events(self):
+        return self._events
+
+    @property
+    def droppedFrames(self):
+        return self.writer.droppedFrames if self.writer else 0
 
+
+    def add_element(self, win):
+        """Add a curses window (sub-window or pad) to the screen."""
+        self.elements.append(win)
+
+    # Everything that talks to the terminal goes through these, see HeadlessScreen for a version without one
+    def init_terminal(self):
         # Initializing Curses
         self.stdscr = curses.initscr()
         curses.noecho()
@@ -38,19 +160,23 @@ class Screen:
             curses.endwin()
             raise ValueError(f"Terminal too small. Required: {self.width}x{self.height}, found: {max_x}x{max_y}")
 
-        self.elements = []
-        self._events = []
+    def new_window(self, geometry):
+        return curses.newwin(*geometry)
 
-    @property
-    def events(self):
-        return self._events
+    def show_cursor(self):
+        curses.curs_set(1)
 
-
-    def add_element(self, win):
-        """Add a curses window (sub-window or pad) to the screen."""
-        self.elements.append(win)
+    def update_terminal(self, cursor):
+        if cursor is not None:
+            curses.setsyx(*cursor)
+        curses.doupdate()
 
     def end(self):
+        if self.writer:
+            self.writer.stop()
+        self.close_terminal()
+
+    def close_terminal(self):
         # Terminate curses screen
         curses.nocbreak()
         self.stdscr.keypad(False)
@@ -59,18 +185,67 @@ class Screen:
         curses.endwin()
 
     def update(self):
+        """Handle pending input and build a frame, drawing it right away or handing it to the writer thread"""
         self.events.clear()
+        if self.writer is None or self.readsStdin:
+            self.read_keys()
 
         for element in self.elements:
-            element.update()
-        
+            element.process()
+
+        frame = self.freeFrames.popleft()
+        while len(frame.drawLists) < len(self.elements):
+            frame.drawLists.append(DrawList())
+            frame.geometries.append(None)
+
+        for idx, element in enumerate(self.elements):
+            element.compose(frame.drawLists[idx])
+            frame.geometries[idx] = element.geometry
+
         # Set cursor position on main screen for any input windows
+        frame.cursor = None
         for element in self.elements:
             if hasattr(element, 'mode') and element.mode == Modes.INPUT_MODE:
-                self.stdscr.move(element.cursorY, element.cursorX)
+                frame.cursor = element.cursor
                 break  # Only handle first input window
-        
-        self.stdscr.refresh()
+
+        if self.writer is None:
+            self.draw_frame(frame)
+            self.release_frame(frame)
+        else:
+            self.writer.submit(frame)
+
+    def release_frame(self, frame):
+        self.freeFrames.append(frame)
+
+    def draw_frame(self, frame):
+        """Write a frame to the terminal, the only place besides read_keys (without readsStdin) that talks to curses after setup"""
+        start = perf_counter()
+        written = 0
+        for element, drawList, geometry in zip(self.elements, frame.drawLists, frame.geometries):
+            written += element.draw(drawList, geometry)
+
+        # Reading keys refreshes the key window, keep its cursor on the same spot so it doesn't jump around
+        if frame.cursor is not None and self.keySource is not None:
+            self.keySource.move_cursor(*frame.cursor)
+
+        self.update_terminal(frame.cursor)
+        self.bytesWritten += written
+        self.bandwidth.record_write(perf_counter() - start)
+
+    def read_keys(self):
+        if self.readsStdin:
+            while select((0,), (), (), 0)[0]:
+                data = os.read(0, 1024)
+                if not data:
+                    break
+                self.keys.extend(decode_keys(data))
+            return
+
+        if self.keySource is None or self.keySource.window is None:
+            return
+        while (ch := self.keySource.window.getch()) != -1:
+            self.keys.append(ch)
 
 
 class Window:
@@ -81,11 +256,17 @@ class Window:
         self.width, self.height = (dimensions[0] - 2, dimensions[1] - 2) if bordered else dimensions
         self.left, self.top = (beginningPoint[0] + 1, beginningPoint[1] + 1) if bordered else beginningPoint 
 
-        self.window = curses.newwin(dimensions[1], dimensions[0], beginningPoint[1], beginningPoint[0])
-
-        self.strings = []
+        # The curses window is created by the drawing side once it sees the geometry
+        self.geometry = (dimensions[1], dimensions[0], beginningPoint[1], beginningPoint[0])
+        self.window = None
+        self.drawnGeometry = None
 
         self.bordered = bordered
+
+        self.strings = RenderBuffer()
+        self.positionedStrings = [] # Strings that are edited in place (e.g. the input line), drawn every frame
+        self.staticRows = () # Rows kept across frames until replaced, wrapped once when set
+        self.staticLines = []
     
     def resize_window(self, new_dimensions, new_position=None):
         if new_position is None:
@@ -95,37 +276,84 @@ class Window:
         self.width, self.height = (new_dimensions[0] - 2, new_dimensions[1] - 2) if self.bordered else new_dimensions
         self.left, self.top = (new_position[0] + 1, new_position[1] + 1) if self.bordered else new_position
 
-        # Create new curses window
-        self.window = curses.newwin(new_dimensions[1], new_dimensions[0], new_position[1], new_position[0])
-
+        # The curses window gets recreated when the next frame is drawn
+        self.geometry = (new_dimensions[1], new_dimensions[0], new_position[1], new_position[0])
+        self.wrap_static_rows()
 
+    def create_window(self, geometry):
+        return self.screen.new_window(geometry)
 
     def process(self):
-        self.print_strings()
+        """Per-frame logic that runs on the game loop before composing"""
+
+    def compose(self, drawList):
+        """Turn the strings of this frame into draw calls"""
+        drawList.clear()
+        strings = self.strings
+        for idx in range(strings.count):
+            self.compose_string(drawList, strings.xs[idx], strings.ys[idx], strings.vals[idx], strings.wraps[idx])
+
+        for string in self.positionedStrings:
+            self.compose_string(drawList, string.x, string.y, string.val, string.wrap)
+
+        for y, x, line, length in self.staticLines:
+            drawList.add(y, x, line, length)
+
+    def compose_string(self, drawList, x, y, val, wrapped):
+        if wrapped:
+            for i, line in enumerate(wrap(val, self.width - x, drop_whitespace = False)):
+                if y + i < self.height:
+                    drawList.add(y + i + int(self.bordered), x + int(self.bordered), line, self.width - x)
+        elif y < self.height:
+            drawList.add(y + int(self.bordered), x + int(self.bordered), val, self.width - x)
+
+    def draw(self, drawList, geometry):
+        if geometry is not self.drawnGeometry:
+            if self.window is not None:
+                # Blank out the old area, otherwise shrinking leaves stale characters behind
+                self.window.erase()
+                self.window.noutrefresh()
+            self.window = self.create_window(geometry)
+            self.drawnGeometry = geometry
+
+        # erase instead of clear, clear makes curses repaint the whole terminal every frame
+        self.window.erase()
+        written = 0
+        if self.bordered:
+            self.window.box()
+            written += 2 * geometry[1] + 2 * (geometry[0] - 2)
+        written += self.print_strings(drawList)
+        self.window.noutrefresh()
+        return written
+
+    def print_strings(self, drawList):
+        written = 0
+        window = self.window
+        ys, xs, texts, lengths = drawList.ys, drawList.xs, drawList.texts, drawList.lengths
+        for idx in range(drawList.count):
+            window.addnstr(ys[idx], xs[idx], texts[idx], lengths[idx])
+            written += min(len(texts[idx]), lengths[idx])
+        return written
 
-    def update(self):
-        self.window.clear()
-        if self.bordered: self.window.box()
-        self.process() 
-        self.window.refresh()
-
-
-    def print_strings(self):
-        for string in self.strings:
-            if string.wrap:
-                wrappedLines = wrap(string.val, self.width - string.x, drop_whitespace = False)
-                for i, line in enumerate(wrappedLines):
-                    if string.y + i < self.height:
-                        self.window.addnstr(string.y + i + int(self.bordered), string.x + int(self.bordered), line, self.width - string.x)
-            else:
-                if string.y < self.height:
-                    self.window.addnstr(string.y + int(self.bordered), string.x + int(self.bordered), string.val, self.width - string.x)
-        
     def add_string(self, x, y, val, wrap = True):
-        self.strings.append(PositionedString(x, y, val, wrap))
+        self.strings.add(x, y, val, wrap)
 
     def add_positioned_string(self, pstr: PositionedString):
-        self.strings.append(pstr)
+        self.positionedStrings.append(pstr)
+
+    def set_static_rows(self, rows):
+        """Show rows (one string per line, starting at the top) until replaced, passing the same tuple again is free"""
+        if rows is self.staticRows:
+            return
+        self.staticRows = rows
+        self.wrap_static_rows()
+
+    def wrap_static_rows(self):
+        self.staticLines = []
+        for y, row in enumerate(self.staticRows):
+            for i, line in enumerate(wrap(row, self.width, drop_whitespace = False)):
+                if y + i < self.height:
+                    self.staticLines.append((y + i + int(self.bordered), int(self.bordered), line, self.width))
 
     def clear_strings(self):
         self.strings.clear()
@@ -133,14 +361,29 @@ class Window:
 class InputWindow(Window):
     def __init__(self, dimensions, beginningPoint, screen: Screen, bordered = True, maxInputLength = 100, startMode = "string", **kwargs):
         super().__init__(dimensions, beginningPoint, screen, bordered)
+        self.screen.keySource = self
 
-        self.window.nodelay(True)
         self.change_mode(startMode, **kwargs)
 
         # input attributes
         self._userInput = None
         self.maxInputLength = maxInputLength
 
+    @property
+    def cursor(self):
+        return self.cursorY, self.cursorX
+
+    def create_window(self, geometry):
+        window = super().create_window(geometry)
+        window.nodelay(True)
+        return window
+
+    def move_cursor(self, screenY, screenX):
+        try:
+            self.window.move(screenY - self.top + int(self.bordered), screenX - self.left + int(self.bordered))
+        except curses.error:
+            pass
+
     @property
     def userInput(self):
         returnVal = self._userInput.lower().strip() if type(self._userInput) is str else self._userInput
@@ -159,17 +402,17 @@ class InputWindow(Window):
                     self.add_string(*string)
         elif mode == "input":
             self.clear_strings()
+            self.positionedStrings.clear()
             self.mode = Modes.INPUT_MODE
             self.prompt = prompt
             self.inputStr = ""
             self.inputLine = PositionedString(0, 0, self.prompt + self.inputStr)
             self.add_positioned_string(self.inputLine)
             self.cursorY, self.cursorX = self.top, self.left + len(self.prompt + self.inputStr) 
-            curses.curs_set(1)
+            self.screen.show_cursor()
 
     
     def process(self):
-        self.print_strings()
         self.get_input()
 
     def calculate_cursor_position(self):
@@ -201,8 +444,12 @@ class InputWindow(Window):
         return cursor_y, cursor_x
                 
     def get_input(self):
+        # Handle every queued key, but stop after Enter so the submitted input isn't overwritten before it is read
+        while self.screen.keys and self._userInput is None:
+            self.handle_key(self.screen.keys.popleft())
+
+    def handle_key(self, ch):
         try:
-            ch = self.window.getch()
             if self.mode == Modes.INPUT_MODE:
                 if ch in (10, 13):  # Enter
                     # self._userInput = self.inputStr
@@ -234,6 +481,8 @@ class InputWindow(Window):
                     self.cursorY, self.cursorX = self.calculate_cursor_position()
             if ch in (27,): # ESC
                 self.screen.events.append(Events.EXIT)
+            elif ch in (16,): # Ctrl+P
+                self.screen.events.append(Events.TOGGLE_METRICS)
         
         except:
             pass
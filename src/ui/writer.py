@@ -0,0 +1,59 @@
+from src.settings import *
+
+from threading import Thread, Condition
+
+
+class TerminalWriter(Thread):
+    """Flushes frames to the terminal on its own thread, only the newest frame is kept if the terminal falls behind"""
+
+    def __init__(self, screen):
+        super().__init__(name = "terminal-writer", daemon = True)
+        self.screen = screen
+        self.condition = Condition()
+        self.pendingFrame = None
+        self.running = True
+        self.error = None # Exception that stopped the thread, raised again on the game loop by submit
+
+        self.droppedFrames = 0 # Frames replaced by a newer one before they were drawn
+
+    def submit(self, frame):
+        if self.error is not None:
+            raise self.error
+        with self.condition:
+            if self.pendingFrame is not None:
+                self.droppedFrames += 1
+                self.screen.release_frame(self.pendingFrame)
+            self.pendingFrame = frame
+            self.condition.notify()
+
+    def run(self):
+        try:
+            self.write_frames()
+        except Exception as e:
+            self.error = e
+
+    def write_frames(self):
+        while True:
+            with self.condition:
+                if self.pendingFrame is None and self.running:
+                    # Without readsStdin keys are read here, wake up regularly even without frames
+                    self.condition.wait(None if self.screen.readsStdin else KEY_POLL_INTERVAL)
+                frame, self.pendingFrame = self.pendingFrame, None
+                running = self.running
+
+            # curses is not thread safe, when keys come through curses they are read here and handed over through a queue
+            if not self.screen.readsStdin:
+                self.screen.read_keys()
+
+            if frame is not None:
+                self.screen.draw_frame(frame)
+                self.screen.release_frame(frame)
+            elif not running:
+                break
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.is_alive():
+            self.join()
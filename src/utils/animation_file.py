@@ -0,0 +1,94 @@
+from src.settings import *
+
+from os.path import getsize, getmtime
+import json
+
+
+class AnimationFile:
+    """Frames of an ascii animation file (rows separated by blank lines), read lazily instead of all at once"""
+
+    def __init__(self, path):
+        self.path = path
+        self.indexPath = path + ".idx"
+        self._offsets = None
+        self.dimensions = None # (width, height) of the frames, set by the first frame read
+
+    @property
+    def offsets(self):
+        """Byte offset of every frame, loaded from the side index or built with one pass over the file"""
+        if self._offsets is None:
+            self._offsets = self.load_index()
+            if self._offsets is None:
+                self._offsets = [offset for offset, _ in self.scan()]
+                self.save_index()
+        return self._offsets
+
+    def load_index(self):
+        try:
+            with open(self.indexPath, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # The index is only valid for the exact file it was built from
+        if index.get("size") != getsize(self.path) or index.get("mtime") != getmtime(self.path):
+            return None
+        self.dimensions = tuple(index["dimensions"]) if index.get("dimensions") else None
+        return index["offsets"]
+
+    def save_index(self):
+        index = {"size": getsize(self.path), "mtime": getmtime(self.path), "dimensions": self.dimensions, "offsets": self._offsets}
+        try:
+            with open(self.indexPath, "w") as f:
+                json.dump(index, f)
+        except OSError:
+            pass # The index is only a shortcut, everything still works without it
+
+    def scan(self, start = 0, frameNumber = 0):
+        """Yield (byte offset, frame) pairs from start on, keeping a single frame in memory at a time"""
+        frame = []
+        frameOffset = offset = start
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            for line in f:
+                if line.isspace():
+                    if frame:
+                        yield frameOffset, self.validate(frame, frameNumber)
+                        frameNumber += 1
+                    frame = []
+                else:
+                    if not frame:
+                        frameOffset = offset
+                    frame.append(line.decode().strip())
+                offset += len(line)
+
+        # Last frame of a file that doesn't end with a blank line
+        if frame:
+            yield frameOffset, self.validate(frame, frameNumber)
+
+    def validate(self, frame, frameNumber):
+        width = len(frame[0])
+        for rowIdx, row in enumerate(frame):
+            if len(row) != width:
+                raise ValueError(f"{self.path}: row {rowIdx} of frame {frameNumber} is {len(row)} characters wide, expected {width}.")
+
+        if self.dimensions is None:
+            self.dimensions = (width, len(frame))
+        elif (width, len(frame)) != self.dimensions:
+            raise ValueError(f"{self.path}: frame {frameNumber} is {width}x{len(frame)}, expected {self.dimensions[0]}x{self.dimensions[1]}.")
+        return frame
+
+    def frames(self, start = 0):
+        """Yield frames starting from frame number start"""
+        offset = self.offsets[start] if start else 0
+        for _, frame in self.scan(offset, start):
+            yield frame
+
+    def read_frame(self, frameNumber):
+        return next(self.frames(frameNumber))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, frameNumber):
+        return self.read_frame(frameNumber)
@@ -14,6 +14,19 @@ def write_dict_to_json(dict, *path):
         print(f"Error clearing file: {e}")
 
 
+def append_json_line(dict, *path):
+    """Append dict as one line of JSON, returns the number of bytes written"""
+    fullPath = join(*path)
+    line = (json.dumps(dict) + "\n").encode()
+    try:
+        with open(fullPath, "ab") as f:
+            f.write(line)
+        return len(line)
+    except Exception as e:
+        print(f"Error appending to file: {e}")
+        return 0
+
+
 def clear_file(*path):
     fullPath = join(*path)
     try:
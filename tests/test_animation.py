@@ -0,0 +1,81 @@
+from src.animation import AsciiAnimation, AnimationCompositor
+
+import unittest
+
+
+class RecordingWindow:
+    """Keeps the strings added to it instead of drawing them"""
+
+    def __init__(self):
+        self.strings = []
+
+    def add_string(self, x, y, val, wrap = True):
+        self.strings.append((x, y, val))
+
+
+class AnimationCompositorTest(unittest.TestCase):
+    def setUp(self):
+        self.window = RecordingWindow()
+        self.background = AsciiAnimation([["aaaa", "aaaa", "aaaa"], ["bbbb", "bbbb", "bbbb"]], self.window, (2, 1), (4, 3), playContinuously = True)
+        # Sticks out of the background on the right and at the bottom, "." cells show what is below
+        self.character = AsciiAnimation([[".x.", "xxx", ".x."]], self.window, (4, 2), (3, 3), disableResizing = True)
+
+        self.compositor = AnimationCompositor(self.window)
+        # Registered top layer first, z decides the order, not registration
+        self.compositor.add_layer("character", self.character, z = 1, transparentChar = ".")
+        self.compositor.add_layer("background", self.background, z = 0)
+        for animation in (self.background, self.character):
+            animation.paused = True
+
+    def test_transparent_layer_over_opaque(self):
+        self.compositor.set_active(("character", "background"))
+        self.compositor.tick()
+
+        self.assertEqual(self.window.strings, [
+            (2, 1, "aaaa "),
+            (2, 2, "aaax "),
+            (2, 3, "aaxxx"),
+            (2, 4, "   x "),
+        ])
+
+    def test_single_opaque_layer_is_drawn_as_is(self):
+        self.compositor.set_active(("background",))
+        self.compositor.tick()
+
+        self.assertEqual(self.window.strings, [(2, 1, "aaaa"), (2, 2, "aaaa"), (2, 3, "aaaa")])
+
+    def test_repaints_only_layers_that_changed(self):
+        self.compositor.set_active(("character", "background"))
+        self.compositor.tick()
+        rows = list(self.compositor.rows)
+
+        # Nothing changed, every row is the same object as before
+        self.compositor.tick()
+        self.assertTrue(all(new is old for new, old in zip(self.compositor.rows, rows)))
+
+        # The character covers rows 1 to 3 of the canvas, the top row is left alone
+        self.character.frameChanged = True
+        self.compositor.tick()
+        self.assertIs(self.compositor.rows[0], rows[0])
+        self.assertIsNot(self.compositor.rows[1], rows[1])
+        self.assertEqual(self.compositor.rows, rows)
+
+        # The background changing repaints its area, with the character still on top of it
+        self.background.currentFrameIndex = 1
+        self.background.frameChanged = True
+        self.compositor.tick()
+        self.assertEqual(self.compositor.rows, ["bbbb ", "bbbx ", "bbxxx", "   x "])
+
+    def test_resized_layer_rebuilds_everything(self):
+        self.compositor.set_active(("character", "background"))
+        self.compositor.tick()
+
+        self.background.set_reduced(True)
+        self.compositor.tick()
+        # The background shrinks to 2x1 around its center, the canvas now starts there
+        self.assertEqual((self.compositor.left, self.compositor.top), (3, 2))
+        self.assertEqual(self.compositor.rows, ["aax ", " xxx", "  x "])
+
+
+if __name__ == "__main__":
+    unittest.main()
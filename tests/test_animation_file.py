@@ -0,0 +1,78 @@
+from src.utils.animation_file import AnimationFile
+
+from os.path import exists, join
+from tempfile import TemporaryDirectory
+import os
+import unittest
+
+
+class AnimationFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = TemporaryDirectory()
+        self.addCleanup(self.tempDir.cleanup)
+        self.path = join(self.tempDir.name, "animation.txt")
+
+    def write(self, text, mtime = None):
+        with open(self.path, "w") as f:
+            f.write(text)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_frames(self):
+        self.write("ab\ncd\n\nef\ngh\n\n\nij\nkl\n")
+        animation = AnimationFile(self.path)
+
+        # The last frame has no blank line after it
+        self.assertEqual(list(animation.frames()), [["ab", "cd"], ["ef", "gh"], ["ij", "kl"]])
+        self.assertEqual(animation.dimensions, (2, 2))
+
+    def test_read_frame_seeks_to_the_frame(self):
+        self.write("ab\ncd\n\nef\ngh\n\nij\nkl\n\n")
+        animation = AnimationFile(self.path)
+
+        self.assertEqual(len(animation), 3)
+        self.assertEqual(animation[2], ["ij", "kl"])
+        self.assertEqual(animation.read_frame(1), ["ef", "gh"])
+        self.assertEqual(list(animation.frames(1)), [["ef", "gh"], ["ij", "kl"]])
+
+    def test_ragged_rows_raise(self):
+        self.write("ab\ncd\n\nef\ng\n")
+        with self.assertRaisesRegex(ValueError, "row 1 of frame 1"):
+            list(AnimationFile(self.path).frames())
+
+    def test_frame_size_mismatch_raises(self):
+        self.write("ab\ncd\n\nef\ngh\nij\n")
+        with self.assertRaisesRegex(ValueError, "frame 1 is 2x3, expected 2x2"):
+            list(AnimationFile(self.path).frames())
+
+    def test_index_is_reused(self):
+        self.write("ab\n\ncd\n\nef\n")
+        self.assertEqual(len(AnimationFile(self.path)), 3)
+        self.assertTrue(exists(self.path + ".idx"))
+
+        animation = AnimationFile(self.path)
+        self.assertEqual(animation.load_index(), [0, 4, 8])
+        self.assertEqual(animation[2], ["ef"])
+
+    def test_index_is_rebuilt_when_size_changes(self):
+        self.write("ab\n\ncd\n\nef\n", mtime = 1000)
+        self.assertEqual(len(AnimationFile(self.path)), 3)
+
+        self.write("abc\n\ndef\n", mtime = 1000)
+        animation = AnimationFile(self.path)
+        self.assertEqual(len(animation), 2)
+        self.assertEqual(animation[1], ["def"])
+
+    def test_index_is_rebuilt_when_mtime_changes(self):
+        self.write("ab\n\ncd\n\nef\n", mtime = 1000)
+        self.assertEqual(len(AnimationFile(self.path)), 3)
+
+        # Same size, only the modification time tells the file changed
+        self.write("abcd\n\nefgh\n", mtime = 2000)
+        animation = AnimationFile(self.path)
+        self.assertEqual(len(animation), 2)
+        self.assertEqual(animation[1], ["efgh"])
+
+
+if __name__ == "__main__":
+    unittest.main()
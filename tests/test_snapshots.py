@@ -0,0 +1,142 @@
+"""Frame snapshot tests
+
+Every game state and every animation frame (at full and reduced size) is drawn on a HeadlessScreen and the
+resulting character grid is hashed. The hashes are compared against tests/snapshots/golden.json, so any change
+to what ends up on screen shows up as a failing case.
+
+After an intended visual change, regenerate the golden hashes with:
+    UPDATE_SNAPSHOTS=1 python -m unittest tests.test_snapshots
+"""
+from src.settings import *
+from src.main import CoinTossGame
+from src.game_states import build_states
+from src.autoplay import AutoPlay
+from src.ui.headless import HeadlessScreen
+from src.ui.bandwidth import QualityLevel
+from src.utils.animation_file import AnimationFile
+
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+from tempfile import mkdtemp, TemporaryDirectory
+import json
+import os
+import random
+import unittest
+
+GOLDEN_FILE = join(dirname(abspath(__file__)), "snapshots", "golden.json")
+UPDATE_SNAPSHOTS = os.environ.get("UPDATE_SNAPSHOTS") == "1"
+
+SEED = 0
+SIZES = {"full": QualityLevel.FULL, "reduced": QualityLevel.REDUCED_SIZE}
+LAYER_FILES = {"idle": FileNames.IDLE_ANIMATION_FILE, "coin_flip": FileNames.COIN_ANIMATION_FILE}
+AUTOPLAY_COMMAND = "auto martingale 50"
+
+game = None # One game per worker process, reset before every case
+
+
+def init_worker(dataRoot):
+    global game
+    # Every worker gets its own data directory inside dataRoot, which is removed once all workers are done
+    game = CoinTossGame(screen = HeadlessScreen(dimensions = (200, 63)), dataDir = (mkdtemp(dir = dataRoot),), autoStart = False)
+
+
+def reset_game(size):
+    random.seed(SEED)
+    game.gameMode = GameMode("Easy", debtThreshold = -4500, goalMoneyAmount = 4000, initialBalance = 1000)
+    game.playerBalance = 1000
+    game.betAmount = 100
+    game.gameOver = False
+    game.loanMode = False
+    game.autoPlay = None
+    game.start_session()
+
+    game.apply_quality(SIZES[size])
+    for layer in game.compositor.layers.values():
+        # Frames only change when a case says so, never because time passed
+        layer.animation.reset()
+        layer.animation.paused = True
+
+
+def draw_state(stateName):
+    if stateName == "auto_play":
+        game.autoPlay = AutoPlay.from_command(AUTOPLAY_COMMAND, game.playerBalance)
+    game.change_state(stateName)
+    game.update_display()
+
+
+def draw_animation_frame(layerName, frameIndex):
+    game.mainWin.clear_strings()
+    game.balanceWindow.clear_strings()
+    game.mainWin.set_static_rows(())
+
+    animation = game.compositor.layers[layerName].animation
+    animation.currentFrameIndex = frameIndex
+    animation.frameChanged = True
+    game.compositor.set_active((layerName,))
+    game.compositor.tick()
+    game.render_balance()
+
+
+def render_case(case):
+    """Draw one (kind, name, size, frame index) case, returns its id and the hash of the screen"""
+    kind, name, size, frameIndex = case
+    reset_game(size)
+    if kind == "state":
+        draw_state(name)
+        caseId = f"state/{name}/{size}"
+    else:
+        draw_animation_frame(name, frameIndex)
+        caseId = f"frame/{name}/{size}/{frameIndex}"
+
+    game.screen.update()
+    return caseId, blake2b(game.screen.snapshot().encode(), digest_size = 8).hexdigest()
+
+
+def snapshot_cases():
+    cases = [("state", stateName, size, None) for stateName in build_states() for size in SIZES]
+    for layerName, fileName in LAYER_FILES.items():
+        # Counted by reading the frames, len() would write a side index into the source tree
+        frameCount = sum(1 for _ in AnimationFile(join(MAIN_DIR, "Animations", fileName)).frames())
+        cases.extend(("frame", layerName, size, frameIndex) for size in SIZES for frameIndex in range(frameCount))
+    return cases
+
+
+def render_all():
+    cases = snapshot_cases()
+    workers = os.cpu_count() or 1
+    with TemporaryDirectory() as dataRoot, ProcessPoolExecutor(workers, initializer = init_worker, initargs = (dataRoot,)) as executor:
+        return dict(executor.map(render_case, cases, chunksize = max(len(cases) // (workers * 4), 1)))
+
+
+class SnapshotTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.hashes = render_all()
+        if UPDATE_SNAPSHOTS:
+            os.makedirs(dirname(GOLDEN_FILE), exist_ok = True)
+            with open(GOLDEN_FILE, "w") as f:
+                json.dump(cls.hashes, f, indent = 1, sort_keys = True)
+
+        with open(GOLDEN_FILE, "r") as f:
+            cls.golden = json.load(f)
+
+    def assert_matches_golden(self, prefix):
+        hashes = {caseId: value for caseId, value in self.hashes.items() if caseId.startswith(prefix)}
+        golden = {caseId: value for caseId, value in self.golden.items() if caseId.startswith(prefix)}
+
+        added, removed = sorted(hashes.keys() - golden.keys()), sorted(golden.keys() - hashes.keys())
+        if added or removed:
+            self.fail(f"Cases added: {added[:10]}, removed: {removed[:10]}, regenerate the golden hashes.")
+        changed = sorted(caseId for caseId in hashes if hashes[caseId] != golden[caseId])
+        if changed:
+            self.fail(f"{len(changed)} snapshots changed, first ones: {', '.join(changed[:10])}")
+
+    def test_states(self):
+        self.assert_matches_golden("state/")
+
+    def test_animation_frames(self):
+        self.assert_matches_golden("frame/")
+
+
+if __name__ == "__main__":
+    unittest.main()